@@ -3,10 +3,11 @@ import os.path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from nuscenes.nuscenes import NuScenes
-from nuscenes.can_bus.can_bus_api import NuScenesCanBus
 
 from utils.smooth_vel import CubicSplineSmooth,MoveAverage,MoveAverageWithExpWeight
+from utils.odometry import ackermann_velocity, ackermann_odometry
+from utils.time_sync import synchronize, interp_sorted
+from utils.wheel_imu_ekf import WheelImuEKF
 # Project ：SLAMBox 
 # File    ：ackermanModel.py
 # Author  ：fzhiheng
@@ -17,93 +18,99 @@ from utils.smooth_vel import CubicSplineSmooth,MoveAverage,MoveAverageWithExpWei
     Ackerman模型
 """
 
-if __name__ == '__main__':
-    dataset_root = "./v1.0-mini"  # 数据集路径
+# 方向盘的转角获得前轮的转角还需要一个转向比
+# nuscenes使用的雷诺电动车的转向比为 <未知>，初步搜索到的是16.6:1，官方文档里暂时没有找到
+steer_radio = 16.6 # 转向角
+wheel_base = 2.588 # 前后轮轴距
+radius = 0.305  # Known Zoe wheel radius in meters.
+
+
+def ackermann_scene(context, scene_name):
+    """
+    单个场景的阿克曼模型航迹推算以及与IMU的融合，可以直接传给runner.run_scenes
+
+    Args:
+        context: runner.SceneContext
+        scene_name: 场景名
+    Returns:
+        dict: chassis_time, steer_raw, steer_corrected, steer_offset_can, feedback_time, steer_feedback_degree,
+              wheel_traj(tum), clock, aligned(重采样到clock上的角速度), imu_offset, fused(EKF的状态)
+    """
+    # 结果要返回给主进程，不使用内存映射
+    can_cache = context.can_cache
+    chassis = can_cache.get_columns(scene_name, 'zoe_veh_info', mmap=False)
+    steer_raw = chassis['steer_raw']
+    steer_corrected = chassis['steer_corrected']
+    steer_offset_can = chassis['steer_offset_can']
+    chassis_time = chassis['utime'] / 1e6
+
+    feedback = can_cache.get_columns(scene_name, 'steeranglefeedback', ['utime', 'value'])
+    steer_feedback = feedback['value']
+    steer_feedback_degree = steer_feedback * 180 / np.pi
+    feedback_time = feedback['utime'] / 1e6
+
+    # 获取车轮的速度
+    # FL_wheel_speed = chassis['FL_wheel_speed']
+    # FR_wheel_speed = chassis['FR_wheel_speed']
+    RR_wheel_speed = chassis['RR_wheel_speed']
+    RL_wheel_speed = chassis['RL_wheel_speed']
+
+    # 这里先使用底盘中的steer_corrected，其实应该使用steer_feedback，w_wheel为由阿克曼模型得到的角速度
+    vx, w_wheel = ackermann_velocity(steer_corrected, RL_wheel_speed, RR_wheel_speed, steer_radio, wheel_base, radius)
+
+    # 航迹推算得到的轨迹(tum格式)，也可以直接使用utils.visual.plot_tum显示
+    wheel_traj = ackermann_odometry(chassis_time, steer_corrected, RL_wheel_speed, RR_wheel_speed, steer_radio, wheel_base, radius,
+                                    output="tum")
+
+    # 和IMU得到的角速度做一个对比
+    imu = can_cache.get_columns(scene_name, 'ms_imu', ['utime', 'rotation_rate'])
+    imu_time = imu['utime']
+    imu_time = imu_time/1e6
+    rotation_rate = imu['rotation_rate']
+    w_imu = rotation_rate[:,-1]
+
+    # 估计IMU相对底盘的时间偏移，并重采样到底盘的时钟上
+    clock, aligned, offsets = synchronize({'zoe_veh_info': (chassis_time, w_wheel), 'ms_imu': (imu_time, w_imu)})
+
+    # 轮速作为过程模型、陀螺仪作为观测的EKF，估计位姿和陀螺仪零偏
+    fused = WheelImuEKF().run(clock, interp_sorted(clock, chassis_time, vx), aligned['zoe_veh_info'], aligned['ms_imu'])
+    return {"chassis_time": chassis_time, "steer_raw": steer_raw, "steer_corrected": steer_corrected,
+            "steer_offset_can": steer_offset_can, "feedback_time": feedback_time,
+            "steer_feedback_degree": steer_feedback_degree, "wheel_traj": wheel_traj, "clock": clock, "aligned": aligned,
+            "imu_offset": offsets['ms_imu'], "fused": fused}
 
-    # 方向盘的转角获得前轮的转角还需要一个转向比
-    # nuscenes使用的雷诺电动车的转向比为 <未知>，初步搜索到的是16.6:1，官方文档里暂时没有找到
-    steer_radio = 16.6 # 转向角
-    wheel_base = 2.588 # 前后轮轴距
 
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    nusc_can = NuScenesCanBus(dataroot=dataset_root)
+if __name__ == '__main__':
+    from dataset_tutorial.nuscenes.runner import run_scenes
+
+    dataset_root = "./v1.0-mini"  # 数据集路径
 
-    # 显示车辆的转向角
-    for scene in nusc.scene:
-        scene_name = scene['name']
+    # 各个场景并行计算，画图在主进程中按场景顺序进行
+    results, failures = run_scenes(ackermann_scene, dataset_root, 'v1.0-mini')
+    for scene_name, result in results.items():
         print(scene_name)
-        # nusc_can.print_all_message_stats(scene_name)
-        chassis = nusc_can.get_messages(scene_name, 'zoe_veh_info')
-        steer_raw = np.array([m['steer_raw'] for m in chassis])
-        steer_corrected = np.array([m['steer_corrected'] for m in chassis])
-        steer_offset_can = np.array([m['steer_offset_can'] for m in chassis])
-        chassis_time = np.array([m['utime'] for m in chassis]) / 1e6
-
-        feedback = nusc_can.get_messages(scene_name, 'steeranglefeedback')
-        steer_feedback = np.array([m['value'] for m in feedback])
-        steer_feedback_degree = steer_feedback * 180 / np.pi
-        feedback_time = np.array([m['utime'] for m in feedback]) / 1e6
+        chassis_time = result['chassis_time']
+        clock, aligned, fused, wheel_traj = result['clock'], result['aligned'], result['fused'], result['wheel_traj']
+        print(f"ms_imu time offset: {result['imu_offset']:.4f}s")
+        print(f"gyro bias: {fused[-1, 4]:.5f} rad/s")
 
         # 查看转向角
         # plt.title(scene_name)
-        # plt.plot(chassis_time-chassis_time[0],steer_raw, color='red')
-        # plt.plot(chassis_time-chassis_time[0],steer_corrected, color='green')
-        # plt.plot(chassis_time-chassis_time[0],steer_offset_can, color='blue')
-        # plt.plot(feedback_time-chassis_time[0],steer_feedback_degree, color='black')
+        # plt.plot(chassis_time-chassis_time[0],result['steer_raw'], color='red')
+        # plt.plot(chassis_time-chassis_time[0],result['steer_corrected'], color='green')
+        # plt.plot(chassis_time-chassis_time[0],result['steer_offset_can'], color='blue')
+        # plt.plot(result['feedback_time']-chassis_time[0],result['steer_feedback_degree'], color='black')
         # plt.legend(['steer_raw', 'steer_corrected', 'steer_offset_can', 'steer_feedback'])
         # plt.show()
 
-        # 获取车轮的速度
-        # FL_wheel_speed = np.array([m['FL_wheel_speed'] for m in chassis])
-        # FR_wheel_speed = np.array([m['FR_wheel_speed'] for m in chassis])
-        RR_wheel_speed = np.array([m['RR_wheel_speed'] for m in chassis])
-        RL_wheel_speed = np.array([m['RL_wheel_speed'] for m in chassis])
-
-        vx = (RR_wheel_speed + RL_wheel_speed) / 2
-        radius = 0.305  # Known Zoe wheel radius in meters.
-        circumference = 2 * np.pi * radius
-        vx *= (circumference / 60)
-
-        vy = np.zeros_like(vx)
-        wheel_steer = steer_corrected * np.pi / (180 * steer_radio)  # 这里先使用底盘中的steer_corrected，其实应该使用steer_feedback
-        w_wheel= vx * np.tan(wheel_steer) / wheel_base  # 由阿克曼模型得到的角速度
-
-        # 和IMU得到的角速度做一个对比
-        imu = nusc_can.get_messages(scene_name, 'ms_imu')
-        imu_time = np.array([m['utime'] for m in imu])
-        imu_time = imu_time/1e6
-        rotation_rate = np.array([m['rotation_rate'] for m in imu])
-        w_imu = rotation_rate[:,-1]
-
-        plt.title(scene_name)
-        plt.plot(imu_time-chassis_time[0],w_imu, color='orange')
-        plt.plot(chassis_time - chassis_time[0], w_wheel, color='green')
-        plt.legend(['imu','ackerman'])
+        fig, (ax_w, ax_traj) = plt.subplots(1, 2, figsize=(12, 5))
+        fig.suptitle(scene_name)
+        ax_w.plot(clock - chassis_time[0], aligned['ms_imu'], color='orange')
+        ax_w.plot(clock - chassis_time[0], aligned['zoe_veh_info'], color='green')
+        ax_w.plot(clock - chassis_time[0], fused[:, 3], color='blue')
+        ax_w.legend(['imu','ackerman','ekf'])
+        # 航迹推算的平面轨迹
+        ax_traj.plot(wheel_traj[:, 1], wheel_traj[:, 2], color='green')
+        ax_traj.set_aspect('equal')
+        ax_traj.legend(['ackerman'])
         plt.show()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-        # print(chassis[0].keys())
-        # break
@@ -0,0 +1,155 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+import shutil
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：can_cache.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+CAN bus数据的列式缓存：每个(scene, message)的json只解析一次，按字段保存成.npy，之后按需内存映射读取
+"""
+
+
+class CanBusCache:
+    def __init__(self, dataroot, cache_root=None):
+        """
+
+        Args:
+            dataroot: nuscenes数据集的根目录，CAN bus数据位于dataroot/can_bus下
+            cache_root: 缓存目录，默认为dataroot/can_bus/.cache
+        """
+        self.can_dir = os.path.join(dataroot, 'can_bus')
+        self.cache_root = os.path.join(self.can_dir, '.cache') if cache_root is None else cache_root
+
+    def _source_path(self, scene_name, message_name):
+        return os.path.join(self.can_dir, f"{scene_name}_{message_name}.json")
+
+    def _cache_dir(self, scene_name, message_name):
+        return os.path.join(self.cache_root, f"{scene_name}_{message_name}")
+
+    @staticmethod
+    def _source_stamp(source_path):
+        stat = os.stat(source_path)
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def _load_meta(self, scene_name, message_name):
+        meta_path = os.path.join(self._cache_dir(scene_name, message_name), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding='utf8') as fp:
+            meta = json.load(fp)
+        if meta["source"] != self._source_stamp(self._source_path(scene_name, message_name)):
+            return None
+        return meta
+
+    def build(self, scene_name, message_name):
+        """
+        解析json并写入缓存，返回缓存的元信息
+        """
+        source_path = self._source_path(scene_name, message_name)
+        stamp = self._source_stamp(source_path)
+        with open(source_path, "r") as fp:
+            messages = json.load(fp)
+        if isinstance(messages, dict):
+            messages = [messages]
+
+        cache_dir = self._cache_dir(scene_name, message_name)
+        tmp_dir = cache_dir + f".tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        fields = {}
+        keys = list(messages[0].keys()) if messages else []
+        for key in keys:
+            column = np.array([m[key] for m in messages])
+            if column.dtype == object:
+                print(f"skip field {key} of {scene_name}_{message_name}: not a regular array")
+                continue
+            if key == 'utime':
+                column = column.astype(np.int64)
+            np.save(os.path.join(tmp_dir, f"{key}.npy"), column)
+            fields[key] = {"dtype": column.dtype.str, "shape": list(column.shape[1:])}
+
+        meta = {"source": stamp, "length": len(messages), "fields": fields}
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding='utf8') as fp:
+            json.dump(meta, fp, indent=4)
+
+        # 先写临时目录再替换，避免其他进程读到写了一半的缓存
+        # 多个进程可能同时构建同一个缓存：已有的缓存有效时保留先写完的，过期时先移走再替换
+        stale_dir = None
+        if os.path.exists(cache_dir):
+            winner = self._load_meta(scene_name, message_name)
+            if winner is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return winner
+            stale_dir = cache_dir + f".stale{os.getpid()}"
+            try:
+                os.replace(cache_dir, stale_dir)
+            except OSError:
+                stale_dir = None  # 已被其他进程移走
+        try:
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            # 目标目录非空，其他进程已经写好了缓存
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            meta = self._load_meta(scene_name, message_name) or meta
+        if stale_dir is not None:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        return meta
+
+    def fields(self, scene_name, message_name):
+        """
+        Returns:
+            message中所有可缓存字段的名字
+        """
+        meta = self._load_meta(scene_name, message_name) or self.build(scene_name, message_name)
+        return list(meta["fields"].keys())
+
+    def get_columns(self, scene_name, message_name, fields=None, mmap=True):
+        """
+        读取message的若干字段，缓存不存在或源文件被修改时自动重建
+
+        Args:
+            scene_name: 比如scene-0061
+            message_name: 比如zoe_veh_info, ms_imu
+            fields: 需要的字段列表，默认为全部字段
+            mmap: 是否以只读内存映射的方式读取
+        Returns:
+            columns: {field: ndarray}，每个字段的第一维为消息个数
+        """
+        meta = self._load_meta(scene_name, message_name) or self.build(scene_name, message_name)
+        fields = list(meta["fields"].keys()) if fields is None else fields
+        cache_dir = self._cache_dir(scene_name, message_name)
+        mmap_mode = 'r' if mmap else None
+        columns = {}
+        for key in fields:
+            if key not in meta["fields"]:
+                raise KeyError(f"{scene_name}_{message_name} has no field {key}")
+            columns[key] = np.load(os.path.join(cache_dir, f"{key}.npy"), mmap_mode=mmap_mode)
+        return columns
+
+    def get_array(self, scene_name, message_name, fields=None):
+        """
+        Returns:
+            以字段为列的结构化数组
+        """
+        columns = self.get_columns(scene_name, message_name, fields)
+        dtype = [(key, col.dtype, col.shape[1:]) for key, col in columns.items()]
+        length = len(next(iter(columns.values()))) if columns else 0
+        array = np.empty(length, dtype=dtype)
+        for key, col in columns.items():
+            array[key] = col
+        return array
+
+
+if __name__ == '__main__':
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    can_cache = CanBusCache(dataset_root)
+    wheel = can_cache.get_columns('scene-0061', 'zoe_veh_info', ['utime', 'FL_wheel_speed'])
+    print(wheel['utime'][:5], wheel['FL_wheel_speed'][:5])
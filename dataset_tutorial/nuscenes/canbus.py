@@ -1,33 +1,41 @@
 
-import numpy as np
-from nuscenes.nuscenes import NuScenes
-from nuscenes.can_bus.can_bus_api import NuScenesCanBus
+import matplotlib.pyplot as plt
 
 
+def scene_messages(context, scene_name):
+    """
+    获取单个场景中不同传感器的数据，可以直接传给runner.run_scenes
+
+    Returns:
+        dict: imu, wheel, zoesensors三种消息的全部字段
+    """
+    # 结果要返回给主进程，不使用内存映射
+    can_cache = context.can_cache
+    imu = can_cache.get_columns(scene_name, 'ms_imu', mmap=False)
+    wheel = can_cache.get_columns(scene_name, 'zoe_veh_info', mmap=False)
+    zoesensors = can_cache.get_columns(scene_name, 'zoesensors', mmap=False)
+    return {"imu": imu, "wheel": wheel, "zoesensors": zoesensors}
+
 
 if __name__ == '__main__':
-    dataset_root = "/home/fzh/MyWork/dataset_tutorial/nuscenes/v1.0-mini"
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    nusc_can = NuScenesCanBus(dataroot=dataset_root)
+    from dataset_tutorial.nuscenes.runner import run_scenes
 
-    for scene in nusc.scene:
-        scene_name = scene['name']
-        # nusc_can.print_all_message_stats(scene_name)
+    dataset_root = "/home/fzh/MyWork/dataset_tutorial/nuscenes/v1.0-mini"
 
-        # 获取不同传感器的数据
-        imu = nusc_can.get_messages(scene_name, 'ms_imu')
-        wheel = nusc_can.get_messages(scene_name, 'zoe_veh_info')
-        zoesensors = nusc_can.get_messages(scene_name, 'zoesensors')
-        print(imu[0].keys())
+    results, failures = run_scenes(scene_messages, dataset_root, 'v1.0-mini')
+    for scene_name, messages in results.items():
+        imu, wheel = messages['imu'], messages['wheel']
+        print(imu.keys())
 
         # 画出IMU三轴加速度图像
         message_name = 'ms_imu'
         key_name = 'linear_accel'
-        nusc_can.plot_message_data(scene_name, message_name, key_name)
+        plt.title(f"{scene_name} {message_name} {key_name}")
+        plt.plot((imu['utime'] - imu['utime'][0]) / 1e6, imu[key_name])
+        plt.show()
 
         # 获取轮速计四个轮子的速度
-        FL_wheel_speed = np.array([m['FL_wheel_speed'] for m in wheel])
-        FR_wheel_speed = np.array([m['FR_wheel_speed'] for m in wheel])
-        RL_wheel_speed = np.array([m['RL_wheel_speed'] for m in wheel])
-        RR_wheel_speed = np.array([m['RR_wheel_speed'] for m in wheel])
-
+        FL_wheel_speed = wheel['FL_wheel_speed']
+        FR_wheel_speed = wheel['FR_wheel_speed']
+        RL_wheel_speed = wheel['RL_wheel_speed']
+        RR_wheel_speed = wheel['RR_wheel_speed']
@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import numpy as np
+
+from dataset_tutorial.nuscenes.snapshot import load_snapshot
+from dataset_tutorial.nuscenes.timeline import Timeline, CAMERA_NAMES
+from utils import se3
+from utils.colmap import world_to_camera, write_model
+
+# Project ：SLAMBox
+# File    ：colmap_export.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+将tutorial.save_images导出的图片写成已知位姿的COLMAP模型，之后只需要colmap point_triangulator三角化
+"""
+
+
+def _transform(rotation, translation):
+    return se3.from_rt(se3.quaternion_to_matrix(np.asarray(rotation, dtype=np.float64)), translation)
+
+
+def camera_poses(snapshot, timeline: Timeline, frames):
+    """
+    所有帧的相机到世界的位姿，T_world_camera = T_world_ego @ T_ego_camera，一次批量计算
+
+    Args:
+        frames: (n,) timeline中的帧号
+    Returns:
+        pose: (n, 4, 4)
+    """
+    ego_pose = snapshot.table('ego_pose')
+    calibrated_sensor = snapshot.table('calibrated_sensor')
+    ego = timeline.ego_pose[frames]
+    calib = timeline.calibrated_sensor[frames]
+    T_world_ego = _transform(ego_pose['rotation'][ego], ego_pose['translation'][ego])
+    T_ego_camera = _transform(calibrated_sensor['rotation'][calib], calibrated_sensor['translation'][calib])
+    return se3.compose(T_world_ego, T_ego_camera)
+
+
+def save_colmap_model(dataset_root, save_to_root, save_mode="sample", camera_name="all", version='v1.0-mini'):
+    """
+    为save_images导出的每个场景写入{save_to_root}/{scene}/{sample|sweep}/sparse/0/{cameras,images,points3D}.bin，
+    图片名为{camera}/{basename}，即图片目录为{save_to_root}/{scene}/{sample|sweep}
+
+    Args:
+        dataset_root: nuscenes数据集的根目录
+        save_to_root: 与save_images相同的保存根目录
+        save_mode: sample或者all，与save_images一致
+        camera_name: 相机名称，all表示所有相机
+        version: 数据集版本
+    """
+    if save_mode not in ("sample", "all"):
+        raise ValueError("save_mode must be sample or all")
+    camera_names = [camera_name] if camera_name != "all" else CAMERA_NAMES
+
+    snapshot = load_snapshot(dataset_root, version)
+    timeline = Timeline(snapshot)
+    sample_data = snapshot.table('sample_data')
+    calibrated_sensor = snapshot.table('calibrated_sensor')
+
+    # 所有场景所有相机的帧一起计算位姿
+    scene_frames = [np.concatenate([timeline.frames(scene_name, camera, key_only=save_mode == "sample", from_first_key=True)
+                                    for camera in camera_names]) for scene_name in timeline.scene_names]
+    frames = np.concatenate(scene_frames)
+    qvecs, tvecs = world_to_camera(camera_poses(snapshot, timeline, frames))
+    splits = np.cumsum([len(f) for f in scene_frames])[:-1]
+
+    for scene_name, frames, qvec, tvec in zip(timeline.scene_names, scene_frames, np.split(qvecs, splits), np.split(tvecs, splits)):
+        # 每个calibrated_sensor对应一个COLMAP相机
+        calib = timeline.calibrated_sensor[frames]
+        calib_rows, camera_index = np.unique(calib, return_inverse=True)
+        first = np.array([frames[np.argmax(calib == row)] for row in calib_rows])
+        K = calibrated_sensor['camera_intrinsic'][calib_rows]
+        rows = timeline.sample_data[first]
+        cameras = {"camera_ids": np.arange(1, len(calib_rows) + 1), "model": "PINHOLE",
+                   "widths": sample_data['width'][rows], "heights": sample_data['height'][rows],
+                   "params": np.stack([K[:, 0, 0], K[:, 1, 1], K[:, 0, 2], K[:, 1, 2]], axis=-1)}
+
+        filenames = timeline.filenames(frames)
+        names = [f"{os.path.basename(os.path.dirname(f))}/{os.path.basename(f)}" for f in filenames]
+        images = {"image_ids": np.arange(1, len(frames) + 1), "qvecs": qvec, "tvecs": tvec,
+                  "camera_ids": camera_index + 1, "names": names}
+
+        model_root = os.path.join(save_to_root, scene_name, "sample" if save_mode == "sample" else "sweep", "sparse", "0")
+        write_model(model_root, cameras, images)
@@ -3,10 +3,9 @@ import os.path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from nuscenes.nuscenes import NuScenes
-from nuscenes.can_bus.can_bus_api import NuScenesCanBus
 
 from utils.smooth_vel import CubicSplineSmooth,MoveAverage,MoveAverageWithExpWeight
+from utils.window_stats import window_stats, detect_static, static_intervals, estimate_gravity_bias
 
 # Project ：SLAMBox 
 # File    ：initIMUByChassisAcc.py
@@ -17,79 +16,81 @@ from utils.smooth_vel import CubicSplineSmooth,MoveAverage,MoveAverageWithExpWei
 使用底盘加速度初始化IMU
 """
 
+def init_imu(context, scene_name):
+    """
+    使用单个场景的底盘加速度初始化IMU，可以直接传给runner.run_scenes
+
+    Returns:
+        dict: wheel_time, longitudinal_accel, transversal_accel, imu_time, linear_accel（时间单位为s），
+              imu_accel, wheel_acc, real_acc（第一个0.1s窗口的均值），static（每个IMU时刻是否静止），
+              intervals（静止区间），gravity, bias（每个静止时刻的初始化结果）
+    """
+    # 这里得到的信息是全部序列的信息，不是sampel的信息，结果要返回给主进程，不使用内存映射
+    wheel_ = context.can_cache.get_columns(scene_name, 'zoe_veh_info', ['utime', 'longitudinal_accel', 'transversal_accel'], mmap=False)
+    imu_ = context.can_cache.get_columns(scene_name, 'ms_imu', ['utime', 'linear_accel'], mmap=False)
+
+    # 获取车辆的纵向加速度和横向加速度
+    longitudinal_accel = wheel_['longitudinal_accel']
+    transversal_accel = wheel_['transversal_accel']
+
+    # 获取IMU的三轴加速度
+    linear_accel = imu_['linear_accel']
+
+    # 将IMU和Wheel的时间转换成s
+    wheel_time = wheel_['utime']/1e6
+    imu_time = imu_['utime']/1e6
+
+    # 以imu_time[0]开始的0.1s窗口，窗口统计由前缀和得到
+    cur_time = imu_time[0]
+    imu_accel, _, _ = window_stats(imu_time, linear_accel, 0.1, starts=[cur_time])
+    wheel_accel, _, _ = window_stats(wheel_time, np.stack([longitudinal_accel, transversal_accel], axis=-1), 0.1, starts=[cur_time])
+
+    # 计算IMU和Wheel的加速度
+    imu_accel = imu_accel[0]
+    wheel_acc = np.array([wheel_accel[0, 0], wheel_accel[0, 1], 0])
+    real_acc = imu_accel - wheel_acc
+
+    # 在每个静止时刻都尝试初始化
+    static = detect_static(imu_time, linear_accel, 0.1)
+    init = estimate_gravity_bias(imu_time, linear_accel, wheel_time, np.stack([longitudinal_accel, transversal_accel], axis=-1),
+                                 0.1, starts=imu_time[static])
+    return {"wheel_time": wheel_time, "longitudinal_accel": longitudinal_accel, "transversal_accel": transversal_accel,
+            "imu_time": imu_time, "linear_accel": linear_accel, "imu_accel": imu_accel, "wheel_acc": wheel_acc, "real_acc": real_acc,
+            "static": static, "intervals": static_intervals(imu_time, static, 0.1), "gravity": init['gravity'], "bias": init['bias']}
+
+
 if __name__ == '__main__':
-    dataset_root = "./v1.0-mini" # 数据集路径
+    from dataset_tutorial.nuscenes.runner import run_scenes
 
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    nusc_can = NuScenesCanBus(dataroot=dataset_root)
+    dataset_root = "./v1.0-mini" # 数据集路径
 
-    for scene in nusc.scene:
-        scene_name = scene['name']
+    results, failures = run_scenes(init_imu, dataset_root, 'v1.0-mini')
+    for scene_name, result in results.items():
         print("=====================>")
         print(scene_name)
-        # nusc_can.print_all_message_stats(scene_name)
-        # 这里得到的信息是全部序列的信息，不是sampel的信息
-        wheel_ = nusc_can.get_messages(scene_name, 'zoe_veh_info')
-        imu_ = nusc_can.get_messages(scene_name, 'ms_imu')
-
-        # 获取车辆的纵向加速度和横向加速度
-        wheel_time = np.array([m['utime'] for m in wheel_])
-        longitudinal_accel = np.array([m['longitudinal_accel'] for m in wheel_])
-        transversal_accel = np.array([m['transversal_accel'] for m in wheel_])
-
-        # nusc_can.plot_message_data(scene_name, 'zoe_veh_info', 'longitudinal_accel')
-        # nusc_can.plot_message_data(scene_name, 'zoe_veh_info', 'transversal_accel')
-
-        # 获取IMU的三轴加速度
-        imu_time = np.array([m['utime'] for m in imu_])
-        linear_accel = np.array([m['linear_accel'] for m in imu_])
+        wheel_time, imu_time, linear_accel = result['wheel_time'], result['imu_time'], result['linear_accel']
 
         # 画出IMUxyz方向的加速度，用不同颜色表示
         x = linear_accel[:, 0]
         y = linear_accel[:, 1]
         z = linear_accel[:, 2]
         plt.title(scene_name)
-        plt.plot((imu_time-imu_time[0])/1e6, x, color='red')
-        plt.plot((imu_time-imu_time[0])/1e6, y, color='green')
-        # plt.plot((imu_time-imu_time[0])/1e6, z, color='blue')
-        plt.plot((wheel_time-imu_time[0])/1e6, longitudinal_accel, color='black')
-        plt.plot((wheel_time-imu_time[0])/1e6, transversal_accel, color='orange')
+        plt.plot(imu_time-imu_time[0], x, color='red')
+        plt.plot(imu_time-imu_time[0], y, color='green')
+        # plt.plot(imu_time-imu_time[0], z, color='blue')
+        plt.plot(wheel_time-imu_time[0], result['longitudinal_accel'], color='black')
+        plt.plot(wheel_time-imu_time[0], result['transversal_accel'], color='orange')
         plt.legend(['x', 'y', 'longitudinal_accel', 'transversal_accel'])
         plt.show()
 
-
         # 计算IMU和Wheel的时间差
-        td = (imu_time[0]-wheel_time[0])/1e6
-
-        # 将IMU和Wheel的时间转换成s
-        wheel_time = wheel_time/1e6
-        imu_time = imu_time/1e6
-
-        cur_time = imu_time[0]
-        last_time = imu_time[0] + 0.1
-        imu_sample = np.where((imu_time >= cur_time) & (imu_time <= last_time))[0]
-        imu_sample_data = linear_accel[imu_sample]
-
-        wheel_sample = np.where((wheel_time >= cur_time) & (wheel_time <= last_time))[0]
-        wheel_sample_data1 = longitudinal_accel[wheel_sample]
-        wheel_sample_data2 = transversal_accel[wheel_sample]
-
-        # 计算IMU和Wheel的加速度
-        imu_accel = np.mean(imu_sample_data, axis=0)
-        wheel_accel1 = np.mean(wheel_sample_data1, axis=0)
-        wheel_accel2 = np.mean(wheel_sample_data2, axis=0)
-        wheel_acc = np.array([wheel_accel1, wheel_accel2, 0])
-        real_acc = imu_accel - wheel_acc
-
-
+        td = imu_time[0]-wheel_time[0]
 
+        imu_accel, wheel_acc, real_acc = result['imu_accel'], result['wheel_acc'], result['real_acc']
         print(imu_accel, np.linalg.norm(imu_accel))
         print(wheel_acc, np.linalg.norm(wheel_acc))
         print(real_acc, np.linalg.norm(real_acc))
 
-
-
-
-
-
-
+        print(f"static intervals: {result['intervals']}")
+        if result['static'].any():
+            print(f"gravity: {np.mean(result['gravity'], axis=0)}, bias: {np.mean(result['bias'], axis=0)}")
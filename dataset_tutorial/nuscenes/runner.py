@@ -0,0 +1,185 @@
+# -*- coding: UTF-8 -*-
+import os
+import time
+import pickle
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from dataset_tutorial.nuscenes.can_cache import CanBusCache
+from dataset_tutorial.nuscenes.snapshot import NuScenesSnapshot, load_snapshot
+from dataset_tutorial.nuscenes.timeline import Timeline
+
+# Project ：SLAMBox
+# File    ：runner.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+按场景并行的批处理：在进程池中对每个场景调用同一个函数，结果按场景顺序汇总。
+元数据快照只在主进程中构建一次，子进程以只读内存映射的方式共享；每个场景的结果保存到检查点，可以断点续跑，
+单个场景出错不影响其他场景
+"""
+
+
+class SceneContext:
+    def __init__(self, dataset_root, version, snapshot_root):
+        """
+        每个工作进程中只创建一次，传给场景函数
+        """
+        self.dataset_root = dataset_root
+        self.version = version
+        self.snapshot = NuScenesSnapshot(snapshot_root)
+        self._timeline = None
+        self._can_cache = None
+        self._scene_rows = None
+
+    def scene(self, scene_name):
+        """
+        Returns:
+            场景名对应的scene记录，与NuScenes.scene中的元素相同
+        """
+        if self._scene_rows is None:
+            self._scene_rows = {name: i for i, name in enumerate(self.snapshot.table('scene').strings('name'))}
+        return self.snapshot.record('scene', self._scene_rows[scene_name])
+
+    @property
+    def timeline(self) -> Timeline:
+        if self._timeline is None:
+            self._timeline = Timeline(self.snapshot)
+        return self._timeline
+
+    @property
+    def can_cache(self) -> CanBusCache:
+        if self._can_cache is None:
+            self._can_cache = CanBusCache(dataroot=self.dataset_root)
+        return self._can_cache
+
+
+_CONTEXT = None
+
+
+def _init_context(dataset_root, version, snapshot_root):
+    global _CONTEXT
+    _CONTEXT = SceneContext(dataset_root, version, snapshot_root)
+
+
+def _init_worker(dataset_root, version, snapshot_root):
+    # 子进程中不弹出窗口，只影响工作进程
+    try:
+        import matplotlib
+        matplotlib.use("Agg", force=True)
+    except ImportError:
+        pass
+    _init_context(dataset_root, version, snapshot_root)
+
+
+def _run_scene(func, scene_name):
+    start = time.perf_counter()
+    try:
+        return scene_name, True, func(_CONTEXT, scene_name), time.perf_counter() - start
+    except Exception:
+        return scene_name, False, traceback.format_exc(), time.perf_counter() - start
+
+
+def _checkpoint_dir(checkpoint, version, func):
+    """
+    检查点按数据集版本和场景函数分目录保存，换了函数或版本不会读到其他函数的结果
+    """
+    return os.path.join(checkpoint, version, f"{func.__module__}.{func.__qualname__}")
+
+
+def _checkpoint_path(checkpoint, scene_name):
+    return os.path.join(checkpoint, f"{scene_name}.pkl")
+
+
+def _save_checkpoint(checkpoint, scene_name, result):
+    path = _checkpoint_path(checkpoint, scene_name)
+    tmp_path = path + f".tmp{os.getpid()}"
+    with open(tmp_path, "wb") as fp:
+        pickle.dump(result, fp)
+    os.replace(tmp_path, path)
+
+
+def run_scenes(func, dataset_root, version='v1.0-mini', scenes=None, workers=None, checkpoint=None, verbose=True):
+    """
+    对每个场景执行func(context, scene_name)
+
+    Args:
+        func: 模块级函数（需要能被pickle），参数为SceneContext和场景名，返回值需要能被pickle
+        dataset_root: nuscenes数据集的根目录
+        version: 数据集版本
+        scenes: 场景名列表，默认为全部场景
+        workers: 进程数，默认为cpu个数；1表示在当前进程中顺序执行，便于调试
+        checkpoint: 检查点目录，已完成的场景结果保存为{checkpoint}/{version}/{func模块名.函数名}/{scene}.pkl，
+                    再次运行时直接读取；失败的场景不保存，下次重跑
+        verbose: 是否打印进度
+    Returns:
+        results: dict，场景名 -> 结果，按scenes的顺序
+        failures: dict，场景名 -> 异常信息
+    """
+    snapshot = load_snapshot(dataset_root, version)
+    scene_names = snapshot.table('scene').strings('name') if scenes is None else list(scenes)
+    workers = os.cpu_count() if workers is None else workers
+
+    done = {}
+    if checkpoint is not None:
+        checkpoint = _checkpoint_dir(checkpoint, version, func)
+        os.makedirs(checkpoint, exist_ok=True)
+        for scene_name in scene_names:
+            if os.path.exists(_checkpoint_path(checkpoint, scene_name)):
+                with open(_checkpoint_path(checkpoint, scene_name), "rb") as fp:
+                    done[scene_name] = pickle.load(fp)
+    todo = [scene_name for scene_name in scene_names if scene_name not in done]
+    if verbose and done:
+        print(f"resume: {len(done)} scenes loaded from {checkpoint}, {len(todo)} to run")
+
+    failures = {}
+    count = 0
+
+    def collect(scene_name, ok, value, seconds):
+        nonlocal count
+        count += 1
+        if ok:
+            done[scene_name] = value
+            if checkpoint is not None:
+                _save_checkpoint(checkpoint, scene_name, value)
+        else:
+            failures[scene_name] = value
+        if verbose:
+            print(f"[{count}/{len(todo)}] {scene_name} {'ok' if ok else 'failed'} ({seconds:.1f}s)")
+
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_context(dataset_root, version, snapshot.snapshot_root)
+        for scene_name in todo:
+            collect(*_run_scene(func, scene_name))
+    elif todo:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), initializer=_init_worker,
+                                 initargs=(dataset_root, version, snapshot.snapshot_root)) as executor:
+            futures = {executor.submit(_run_scene, func, scene_name): scene_name for scene_name in todo}
+            for future in as_completed(futures):
+                try:
+                    collect(*future.result())
+                except BrokenProcessPool:
+                    # 工作进程异常退出（比如被系统杀掉），该场景以及之后无法完成的场景记为失败
+                    collect(futures[future], False, traceback.format_exc(), 0.0)
+
+    if verbose:
+        print(f"{len(done)} scenes done, {len(failures)} failed, {time.perf_counter() - start:.1f}s")
+        for scene_name, error in failures.items():
+            print(f"{scene_name} failed:\n{error}")
+    results = {scene_name: done[scene_name] for scene_name in scene_names if scene_name in done}
+    failures = {scene_name: failures[scene_name] for scene_name in scene_names if scene_name in failures}
+    return results, failures
+
+
+if __name__ == '__main__':
+    from dataset_tutorial.nuscenes.ackermanModel import ackermann_scene
+
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    results, failures = run_scenes(ackermann_scene, dataset_root, 'v1.0-mini', checkpoint=os.path.join(dataset_root, '.runner'))
+    for scene_name, result in results.items():
+        print(f"{scene_name} ms_imu time offset: {result['imu_offset']:.4f}s, gyro bias: {result['fused'][-1, 4]:.5f} rad/s")
@@ -0,0 +1,323 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+import shutil
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：snapshot.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+NuScenes元数据表的二进制快照：将常用的表按列保存为.npy，token之间的引用提前转换为行号，
+读取时按列懒加载并以只读内存映射的方式打开，多个进程可以共享同一份页缓存
+"""
+
+DEFAULT_TABLES = ('scene', 'sample', 'sample_data', 'calibrated_sensor', 'ego_pose', 'sensor')
+
+# 外键字段指向的表，prev/next指向自身所在的表
+REFERENCES = {
+    'scene_token': 'scene',
+    'sample_token': 'sample',
+    'first_sample_token': 'sample',
+    'last_sample_token': 'sample',
+    'ego_pose_token': 'ego_pose',
+    'calibrated_sensor_token': 'calibrated_sensor',
+    'sensor_token': 'sensor',
+}
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _is_fresh(dataroot, version, snapshot_root, tables):
+    """
+    快照存在、包含所有需要的表，且元数据json没有被修改
+    """
+    meta_path = os.path.join(snapshot_root, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r", encoding='utf8') as fp:
+        meta = json.load(fp)
+    return all(name in meta["source"] and meta["source"][name] == _source_stamp(os.path.join(dataroot, version, f"{name}.json"))
+               for name in tables)
+
+
+def _lookup(token_sorted, token_order, tokens):
+    """
+    token -> 行号，不存在的token（包括空字符串）为-1
+    """
+    if len(token_sorted) == 0:
+        return np.full(len(tokens), -1, dtype=np.int32)
+    pos = np.clip(np.searchsorted(token_sorted, tokens), 0, len(token_sorted) - 1)
+    return np.where(token_sorted[pos] == tokens, token_order[pos], -1).astype(np.int32)
+
+
+def _save_strings(table_dir, key, values):
+    encoded = [v.encode('utf8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    np.save(os.path.join(table_dir, f"{key}.offsets.npy"), offsets)
+    np.save(os.path.join(table_dir, f"{key}.blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def _to_array(values):
+    """
+    数值或定长列表转换为数组，空列表（比如非相机的camera_intrinsic）填充为nan
+
+    Returns:
+        array, padded: padded表示存在被填充的空列表
+    """
+    shape = next((np.shape(v) for v in values if np.size(v) > 0), ())
+    if all(np.shape(v) == shape for v in values):
+        return np.array(values), False
+    array = np.full((len(values),) + shape, np.nan)
+    for i, v in enumerate(values):
+        if np.size(v) > 0:
+            array[i] = v
+    return array, True
+
+
+def build_snapshot(dataroot, version, snapshot_root=None, tables=DEFAULT_TABLES):
+    """
+    解析元数据json并写入快照，每个表只在内存中保留列式的数组
+
+    Args:
+        dataroot: nuscenes数据集的根目录
+        version: 比如v1.0-mini, v1.0-trainval
+        snapshot_root: 快照目录，默认为dataroot/.snapshot/version
+        tables: 需要保存的表
+    Returns:
+        snapshot_root
+    """
+    snapshot_root = os.path.join(dataroot, '.snapshot', version) if snapshot_root is None else snapshot_root
+    tmp_root = snapshot_root + f".tmp{os.getpid()}"
+    os.makedirs(tmp_root, exist_ok=True)
+
+    meta = {"version": version, "source": {}, "tables": {}}
+    foreign = {}  # 第二遍再解析的外键: (table, key) -> token数组
+    for name in tables:
+        source_path = os.path.join(dataroot, version, f"{name}.json")
+        meta["source"][name] = _source_stamp(source_path)
+        with open(source_path, "r") as fp:
+            records = json.load(fp)
+
+        table_dir = os.path.join(tmp_root, name)
+        os.makedirs(table_dir, exist_ok=True)
+        columns = {}
+        for key in (records[0].keys() if records else []):
+            values = [r[key] for r in records]
+            if key == 'token':
+                token = np.array(values, dtype='S32')
+                order = np.argsort(token, kind='stable')
+                np.save(os.path.join(table_dir, "token.npy"), token)
+                np.save(os.path.join(table_dir, "token_sorted.npy"), token[order])
+                np.save(os.path.join(table_dir, "token_order.npy"), order.astype(np.int32))
+                columns[key] = "token"
+            elif key in ('prev', 'next') or (key in REFERENCES and REFERENCES[key] in tables):
+                foreign[(name, key)] = np.array(values, dtype='S32')
+                columns[key] = "ref:" + (name if key in ('prev', 'next') else REFERENCES[key])
+            elif isinstance(values[0], str):
+                _save_strings(table_dir, key, values)
+                columns[key] = "str"
+            else:
+                array, padded = _to_array(values)
+                np.save(os.path.join(table_dir, f"{key}.npy"), array)
+                columns[key] = "padded" if padded else "array"
+        meta["tables"][name] = {"length": len(records), "columns": columns}
+        del records
+
+    # 外键转换为行号
+    for (name, key), tokens in foreign.items():
+        target = meta["tables"][name]["columns"][key][4:]
+        target_dir = os.path.join(tmp_root, target)
+        rows = _lookup(np.load(os.path.join(target_dir, "token_sorted.npy")), np.load(os.path.join(target_dir, "token_order.npy")), tokens)
+        np.save(os.path.join(tmp_root, name, f"{key}.npy"), rows)
+
+    with open(os.path.join(tmp_root, "meta.json"), "w", encoding='utf8') as fp:
+        json.dump(meta, fp, indent=4)
+
+    # 先写临时目录再替换，避免其他进程读到写了一半的快照
+    # 多个进程可能同时构建同一个快照：已有的快照有效时保留先写完的，过期时先移走再替换
+    stale_root = None
+    if os.path.exists(snapshot_root):
+        if _is_fresh(dataroot, version, snapshot_root, tables):
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            return snapshot_root
+        stale_root = snapshot_root + f".stale{os.getpid()}"
+        try:
+            os.replace(snapshot_root, stale_root)
+        except OSError:
+            stale_root = None  # 已被其他进程移走
+    try:
+        os.replace(tmp_root, snapshot_root)
+    except OSError:
+        # 目标目录非空，其他进程已经写好了快照
+        shutil.rmtree(tmp_root, ignore_errors=True)
+    if stale_root is not None:
+        shutil.rmtree(stale_root, ignore_errors=True)
+    return snapshot_root
+
+
+class SnapshotTable:
+    def __init__(self, table_dir, meta):
+        self.table_dir = table_dir
+        self.length = meta["length"]
+        self.columns = meta["columns"]
+        self._cache = {}
+
+    def __getstate__(self):
+        # 传给其他进程时只传路径，在子进程中重新内存映射
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def __len__(self):
+        return self.length
+
+    def _load(self, name):
+        if name not in self._cache:
+            self._cache[name] = np.load(os.path.join(self.table_dir, f"{name}.npy"), mmap_mode='r')
+        return self._cache[name]
+
+    def __getitem__(self, column):
+        """
+        Returns:
+            数值列为(n, ...)的只读数组（padded列中的空列表为nan），外键列为被引用表的行号（-1表示空），token列为S32
+        """
+        kind = self.columns[column]
+        if kind == "str":
+            raise TypeError(f"{column} is a string column, use strings()")
+        return self._load(column)
+
+    def strings(self, column, rows=None):
+        """
+        Returns:
+            字符串列的取值列表
+        """
+        assert self.columns[column] == "str"
+        offsets, blob = self._load(f"{column}.offsets"), self._load(f"{column}.blob")
+        rows = range(self.length) if rows is None else np.atleast_1d(rows)
+        return [blob[offsets[i]:offsets[i + 1]].tobytes().decode('utf8') for i in rows]
+
+    def index(self, token):
+        """
+        Returns:
+            token对应的行号，O(log n)
+        """
+        rows = _lookup(self._load("token_sorted"), self._load("token_order"), np.atleast_1d(np.asarray(token, dtype='S32')))
+        return rows if np.ndim(token) else int(rows[0])
+
+
+class NuScenesSnapshot:
+    def __init__(self, snapshot_root):
+        self.snapshot_root = snapshot_root
+        with open(os.path.join(snapshot_root, "meta.json"), "r", encoding='utf8') as fp:
+            self.meta = json.load(fp)
+        self.version = self.meta["version"]
+        self.tables = {name: SnapshotTable(os.path.join(snapshot_root, name), table_meta) for name, table_meta in self.meta["tables"].items()}
+        self._reverse = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_reverse"] = {}
+        return state
+
+    def table(self, name) -> SnapshotTable:
+        return self.tables[name]
+
+    def _children(self, table_name, mask=None):
+        """
+        按sample_token分组的反向索引(CSR)，第i个sample的子记录为order[ptr[i]:ptr[i + 1]]
+        """
+        key = (table_name, mask)
+        if key not in self._reverse:
+            parent = np.asarray(self.tables[table_name]['sample_token'])
+            rows = np.arange(len(parent)) if mask is None else np.flatnonzero(self.tables[table_name][mask])
+            order = rows[np.argsort(parent[rows], kind='stable')]
+            ptr = np.searchsorted(parent[order], np.arange(len(self.tables['sample']) + 1), side='left')
+            self._reverse[key] = (order, ptr)
+        return self._reverse[key]
+
+    def _sensor_of(self, sample_data_row):
+        """
+        Returns:
+            sample_data对应的(channel, modality)
+        """
+        cs_row = int(self.tables['sample_data']['calibrated_sensor_token'][sample_data_row])
+        sensor_row = int(self.tables['calibrated_sensor']['sensor_token'][cs_row])
+        sensor = self.tables['sensor']
+        return sensor.strings('channel', sensor_row)[0], sensor.strings('modality', sensor_row)[0]
+
+    def record(self, table_name, row):
+        """
+        与NuScenes.get返回的格式相同的字典，外键转换回token。
+        NuScenes建立的反向索引字段中，sample的data（关键帧channel -> sample_data token）以及sample_data的channel、
+        sensor_modality同样会补上；sample的anns只在快照包含sample_annotation表时补上，
+        其他表的反向索引字段（比如sample_annotation的category_name）不包含
+        """
+        table = self.tables[table_name]
+        record = {}
+        for key, kind in table.columns.items():
+            if kind == "str":
+                record[key] = table.strings(key, row)[0]
+            elif kind == "token":
+                record[key] = table["token"][row].decode()
+            elif kind.startswith("ref:"):
+                ref = int(table[key][row])
+                record[key] = self.tables[kind[4:]]["token"][ref].decode() if ref >= 0 else ""
+            else:
+                value = table[key][row]
+                record[key] = [] if kind == "padded" and np.isnan(value).all() else value.tolist()
+
+        if table_name == 'sample' and 'sample_data' in self.tables:
+            order, ptr = self._children('sample_data', 'is_key_frame')
+            token = self.tables['sample_data']['token']
+            record['data'] = {self._sensor_of(i)[0]: token[i].decode() for i in order[ptr[row]:ptr[row + 1]]}
+            if 'sample_annotation' in self.tables:
+                order, ptr = self._children('sample_annotation')
+                token = self.tables['sample_annotation']['token']
+                record['anns'] = [token[i].decode() for i in order[ptr[row]:ptr[row + 1]]]
+        elif table_name == 'sample_data':
+            record['channel'], record['sensor_modality'] = self._sensor_of(row)
+        return record
+
+    def get(self, table_name, token):
+        """
+        与NuScenes.get(table_name, token)相同
+        """
+        row = self.tables[table_name].index(token)
+        if row < 0:
+            raise KeyError(f"{token} not in {table_name}")
+        return self.record(table_name, row)
+
+    def records(self, table_name):
+        """
+        整个表的记录列表，比如records('scene')对应NuScenes.scene
+        """
+        return [self.record(table_name, i) for i in range(len(self.tables[table_name]))]
+
+
+def load_snapshot(dataroot, version='v1.0-mini', snapshot_root=None, tables=DEFAULT_TABLES):
+    """
+    读取快照，不存在、缺少表或者元数据json被修改时自动重建
+    """
+    snapshot_root = os.path.join(dataroot, '.snapshot', version) if snapshot_root is None else snapshot_root
+    if _is_fresh(dataroot, version, snapshot_root, tables):
+        return NuScenesSnapshot(snapshot_root)
+    build_snapshot(dataroot, version, snapshot_root, tables)
+    return NuScenesSnapshot(snapshot_root)
+
+
+if __name__ == '__main__':
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    snapshot = load_snapshot(dataset_root, 'v1.0-mini')
+    for scene in snapshot.records('scene'):
+        sample = snapshot.get('sample', scene['first_sample_token'])
+        print(scene['name'], sample['timestamp'])
@@ -0,0 +1,142 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+from dataset_tutorial.nuscenes.snapshot import NuScenesSnapshot, load_snapshot
+
+# Project ：SLAMBox
+# File    ：timeline.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+每个场景、每个传感器的按时间排序的帧索引，替代沿着sample_data['next']逐帧查找
+"""
+
+CAMERA_NAMES = ['CAM_FRONT', 'CAM_FRONT_RIGHT', 'CAM_BACK_RIGHT', 'CAM_BACK', 'CAM_BACK_LEFT', 'CAM_FRONT_LEFT']
+
+
+class Timeline:
+    def __init__(self, snapshot: NuScenesSnapshot):
+        """
+        一次遍历sample_data表，按(场景, 传感器, 时间)排序。下文中的帧号均指排序后的位置，
+        可以直接索引timestamp, sample_data, calibrated_sensor, ego_pose, is_key_frame等数组
+        """
+        self.snapshot = snapshot
+        sample_data = snapshot.table('sample_data')
+        sample = snapshot.table('sample')
+        calibrated_sensor = snapshot.table('calibrated_sensor')
+        sensor = snapshot.table('sensor')
+
+        self.scene_names = snapshot.table('scene').strings('name')
+        self.channels = sensor.strings('channel')
+        self._scene_index = {name: i for i, name in enumerate(self.scene_names)}
+        self._channel_index = {name: i for i, name in enumerate(self.channels)}
+
+        cs_row = np.asarray(sample_data['calibrated_sensor_token'])
+        scene_id = np.asarray(sample['scene_token'])[np.asarray(sample_data['sample_token'])]
+        channel_id = np.asarray(calibrated_sensor['sensor_token'])[cs_row]
+        timestamp = np.asarray(sample_data['timestamp'])
+
+        order = np.lexsort((timestamp, channel_id, scene_id))
+        self.sample_data = order.astype(np.int64)
+        self.timestamp = timestamp[order]
+        self.calibrated_sensor = cs_row[order]
+        self.ego_pose = np.asarray(sample_data['ego_pose_token'])[order]
+        self.is_key_frame = np.asarray(sample_data['is_key_frame'])[order]
+
+        # 每个(场景, 传感器)在排序后数组中的起止位置
+        group = scene_id[order].astype(np.int64) * len(self.channels) + channel_id[order]
+        bounds = np.searchsorted(group, np.arange(len(self.scene_names) * len(self.channels) + 1), side='left')
+        self._bounds = bounds
+
+    def _group(self, scene, channel):
+        scene_id = self._scene_index[scene] if isinstance(scene, str) else scene
+        g = scene_id * len(self.channels) + self._channel_index[channel]
+        return self._bounds[g], self._bounds[g + 1]
+
+    def frames(self, scene, channel, key_only=False, from_first_key=False):
+        """
+        Args:
+            scene: 场景名或者场景的行号
+            channel: 比如CAM_FRONT, LIDAR_TOP
+            key_only: 只返回关键帧（即sample中的帧）
+            from_first_key: 从第一个关键帧开始，与从scene['first_sample_token']出发沿next遍历的结果一致
+        Returns:
+            frames: (n,) 按时间排序的帧号
+        """
+        lo, hi = self._group(scene, channel)
+        if from_first_key:
+            key = self.is_key_frame[lo:hi]
+            lo = lo + (int(np.argmax(key)) if key.any() else hi - lo)
+        frames = np.arange(lo, hi)
+        return frames[self.is_key_frame[lo:hi]] if key_only else frames
+
+    def filenames(self, frames):
+        return self.snapshot.table('sample_data').strings('filename', self.sample_data[np.atleast_1d(frames)])
+
+    def tokens(self, frames):
+        return [t.decode() for t in self.snapshot.table('sample_data')['token'][self.sample_data[np.atleast_1d(frames)]]]
+
+    def nearest(self, scene, channel, t, max_dt=None):
+        """
+        O(log n)查找离时间t最近的帧
+
+        Args:
+            t: 标量或(m,)，与timestamp单位相同（微秒）
+            max_dt: 超过该时间差时返回-1
+        Returns:
+            帧号，标量或(m,)
+        """
+        lo, hi = self._group(scene, channel)
+        t = np.asarray(t)
+        if hi == lo:
+            return np.full(t.shape, -1, dtype=np.int64)
+        ts = self.timestamp[lo:hi]
+        pos = np.searchsorted(ts, t)
+        left = np.clip(pos - 1, 0, hi - lo - 1)
+        right = np.clip(pos, 0, hi - lo - 1)
+        idx = np.where(np.abs(ts[right] - t) < np.abs(ts[left] - t), right, left)
+        frames = lo + idx
+        if max_dt is not None:
+            frames = np.where(np.abs(ts[idx] - t) <= max_dt, frames, -1)
+        return frames
+
+    def between(self, scene, channel, t0, t1):
+        """
+        Returns:
+            时间在[t0, t1]内的所有帧号
+        """
+        lo, hi = self._group(scene, channel)
+        ts = self.timestamp[lo:hi]
+        return np.arange(lo + np.searchsorted(ts, t0, side='left'), lo + np.searchsorted(ts, t1, side='right'))
+
+    def synced(self, scene, t=None, channels=CAMERA_NAMES, max_dt=None):
+        """
+        多个传感器的同步帧
+
+        Args:
+            t: (m,) 查询时间，默认为第一个传感器的所有关键帧时间
+            channels: 传感器列表，默认为6个相机
+            max_dt: 超过该时间差时为-1
+        Returns:
+            frames: (m, len(channels))
+        """
+        if t is None:
+            t = self.timestamp[self.frames(scene, channels[0], key_only=True)]
+        t = np.atleast_1d(t)
+        return np.stack([self.nearest(scene, channel, t, max_dt) for channel in channels], axis=-1)
+
+
+def load_timeline(dataroot, version='v1.0-mini'):
+    return Timeline(load_snapshot(dataroot, version))
+
+
+if __name__ == '__main__':
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    timeline = load_timeline(dataset_root, 'v1.0-mini')
+    scene_name = timeline.scene_names[0]
+    frames = timeline.synced(scene_name, max_dt=50000)
+    print(frames[:3])
+    print(timeline.filenames(frames[0]))
@@ -1,13 +1,19 @@
 import os
-import shutil
 import json
+import time
 
-from nuscenes.nuscenes import NuScenes
-from submodule.rotation.conversion import fill_matrix
+import numpy as np
+
+from dataset_tutorial.nuscenes.snapshot import load_snapshot
+from dataset_tutorial.nuscenes.timeline import Timeline, load_timeline, CAMERA_NAMES
+from utils import se3
+from utils.file_export import export_files
+from utils.shard_archive import ShardWriter
 
 
 # 为使用colmap制作的图片数据集
-def save_images(dataset_root, save_to_root, save_mode="sample", camera_name="CAM_FRONT"):
+def save_images(dataset_root, save_to_root, save_mode="sample", camera_name="CAM_FRONT", version='v1.0-mini', export_mode="copy", workers=8,
+                save_format="files"):
     """
 
     Args:
@@ -15,112 +21,132 @@ def save_images(dataset_root, save_to_root, save_mode="sample", camera_name="CAM
         save_to_root: 保存的根目录
         save_mode: 保存模式，有两种，一种是sample，一种是all
         camera_name: 相机名称，有CAM_FRONT, CAM_FRONT_RIGHT, CAM_BACK_RIGHT, CAM_BACK, CAM_BACK_LEFT, CAM_FRONT_LEFT，如果是all模式，则将所有相机的图片都保存下来
+        version: 数据集版本
+        export_mode: 图片的导出方式，copy, hardlink, reflink, symlink，大小和修改时间未变的图片不会重复导出
+        workers: 导出图片的线程数
+        save_format: files: 每帧一个图片文件；shards: 每个场景、相机的图片序列打包为顺序写入的tar分片，
+                     并附带偏移量索引，每条记录带有时间戳和相机内外参，使用utils.shard_archive.ShardReader读取
 
     Returns:
+        stats: 导出的统计信息
 
     """
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    for scene in nusc.scene:
+    if save_mode not in ("sample", "all"):
+        raise ValueError("save_mode must be sample or all")
+    if save_format not in ("files", "shards"):
+        raise ValueError("save_format must be files or shards")
+    camera_names = [camera_name] if camera_name != "all" else CAMERA_NAMES
+
+    snapshot = load_snapshot(dataset_root, version)
+    timeline = Timeline(snapshot)
+    pairs = []
+    stats = {"files": 0, "bytes": 0}
+    start = time.perf_counter()
+    for scene_name in timeline.scene_names:
         # make save root
-        scene_name = scene['name']
         save_scene_root = os.path.join(save_to_root, scene_name)
         os.makedirs(save_scene_root, exist_ok=True)
 
-        if camera_name != "all":
-            camera_names = [camera_name]
-        else:
-            camera_names = ['CAM_FRONT', 'CAM_FRONT_RIGHT', 'CAM_BACK_RIGHT', 'CAM_BACK', 'CAM_BACK_LEFT',
-                            'CAM_FRONT_LEFT']
-
-        def save_image(filename, img_save_root):
-            src_path = os.path.join(dataset_root, filename)
-            base_name = os.path.basename(src_path)
-            dst_path = os.path.join(img_save_root, base_name)
-            shutil.copy(src_path, dst_path)
-
-        for camera_name in camera_names:
+        for camera in camera_names:
             # 创建相机文件夹
-            if save_mode == "sample":
-                camera_root = os.path.join(save_scene_root, "sample", camera_name)
-            elif save_mode == "all":
-                camera_root = os.path.join(save_scene_root, "sweep",camera_name)
-            else:
-                raise ValueError("save_mode must be sample or all")
-            os.makedirs(camera_root, exist_ok=True)
+            mode_root = os.path.join(save_scene_root, "sample" if save_mode == "sample" else "sweep")
+            camera_root = os.path.join(mode_root, camera)
 
-            first_sample_token = scene['first_sample_token']
-            sample = nusc.get('sample', first_sample_token)
-            sensor = nusc.get('sample_data', sample['data'][camera_name])
+            # sample模式只保存关键帧，all模式保存从第一个关键帧开始的所有帧
+            frames = timeline.frames(scene_name, camera, key_only=save_mode == "sample", from_first_key=True)
 
             # 写入内参与外参
-            sensor_calib = nusc.get('calibrated_sensor', sensor['calibrated_sensor_token'])
+            sensor_calib = snapshot.record('calibrated_sensor', timeline.calibrated_sensor[frames[0]])
             translation = sensor_calib['translation']
             rotation = sensor_calib['rotation']
             camera_intrinsic = sensor_calib['camera_intrinsic']
 
             # extrinsic_matrix = transform_matrix(np.array(translation), Quaternion(rotation)).tolist()
-            extrinsic_matrix = fill_matrix(rotation, translation).tolist()
+            extrinsic_matrix = se3.from_rt(se3.quaternion_to_matrix(np.asarray(rotation)), translation).tolist()
             intrinsic = {"fx": camera_intrinsic[0][0], "fy": camera_intrinsic[1][1], "cx": camera_intrinsic[0][2],
                          "cy": camera_intrinsic[1][2], "translation": translation, "rotation": rotation,
                          "matrix": extrinsic_matrix}
 
-            with open(os.path.join(save_scene_root, f"{camera_name}.json"), "w", encoding='utf8') as fp:
+            with open(os.path.join(save_scene_root, f"{camera}.json"), "w", encoding='utf8') as fp:
                 json.dump(intrinsic, fp, ensure_ascii=False, indent=4)
 
             # 保存图片
-            if save_mode == "sample":
-                filename = sensor["filename"]
-                save_image(filename, camera_root)
-                while (sample["next"]):
-                    sample = nusc.get('sample', sample['next'])
-                    sensor = nusc.get('sample_data', sample['data'][camera_name])
-                    filename = sensor["filename"]
-                    save_image(filename, camera_root)
+            filenames = timeline.filenames(frames)
+            if save_format == "shards":
+                with ShardWriter(mode_root, camera) as writer:
+                    for filename, timestamp in zip(filenames, timeline.timestamp[frames].tolist()):
+                        with open(os.path.join(dataset_root, filename), "rb") as fp:
+                            data = fp.read()
+                        key, ext = os.path.splitext(os.path.basename(filename))
+                        writer.write(key, data, {"timestamp": timestamp, **intrinsic}, timestamp=timestamp, ext=ext)
+                        stats["files"] += 1
+                        stats["bytes"] += len(data)
             else:
-                filename = sensor["filename"]
-                save_image(filename, camera_root)
-                while (sensor["next"]):
-                    sensor = nusc.get('sample_data', sensor['next'])
-                    filename = sensor["filename"]
-                    save_image(filename, camera_root)
+                os.makedirs(camera_root, exist_ok=True)
+                for filename in filenames:
+                    pairs.append((os.path.join(dataset_root, filename), os.path.join(camera_root, os.path.basename(filename))))
 
+    if save_format == "shards":
+        stats["seconds"] = time.perf_counter() - start
+        print(f"pack {stats['files']} images into shards, {stats['seconds']:.2f}s, {stats['bytes'] / 1e6 / stats['seconds']:.1f} MB/s")
+        return stats
+    return export_files(pairs, mode=export_mode, workers=workers, manifest_path=os.path.join(save_to_root, "manifest.json"))
 
 
-def get_all_image_name(dataset_root, save_to_root):
+def get_all_image_name(dataset_root, save_to_root, version='v1.0-mini'):
     """
     获取所有图片的名称，注意这里不是sample图片，而是全部的图片
     :param dataset_root:
     :param save_to_root:
+    :param version:
     :return:
     """
 
-    camera_names = ['CAM_FRONT', 'CAM_FRONT_RIGHT', 'CAM_BACK_RIGHT', 'CAM_BACK', 'CAM_BACK_LEFT', 'CAM_FRONT_LEFT']
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    for scene in nusc.scene:
+    timeline = load_timeline(dataset_root, version)
+    for scene_name in timeline.scene_names:
         # make save root
-        scene_name = scene['name']
         save_scene_root = os.path.join(save_to_root, scene_name)
         os.makedirs(save_scene_root, exist_ok=True)
 
         print(f"scenen_name: {scene_name}")
 
-        for camera in camera_names:
-            images_name = []
-            first_sample_token = scene['first_sample_token']
-            sample = nusc.get('sample', first_sample_token)
-            sensor = nusc.get('sample_data', sample['data'][camera])
-            images_name.append(sensor["filename"])
-            while (sensor["next"]):
-                # 注意这里的sensor["next"]，而不是sample["next"]
-                sensor = nusc.get('sample_data', sensor['next'])
-                images_name.append(sensor["filename"])
+        for camera in CAMERA_NAMES:
+            # 与从第一个sample的sensor出发沿sensor["next"]遍历得到的图片相同
+            images_name = timeline.filenames(timeline.frames(scene_name, camera, from_first_key=True))
 
             with open(os.path.join(save_scene_root, camera + ".txt"), "w", encoding='utf8') as fp:
                 tt = "\n".join(images_name)
                 fp.write(tt)
 
 
+def camera_calibration(context, scene_name, camera_name="CAM_FRONT"):
+    """
+    场景第一个sample中相机的内外参，可以直接传给runner.run_scenes
+
+    Returns:
+        dict: first_sample_token, filename, translation, rotation, matrix(4x4外参), intrinsic(fx, fy, cx, cy)
+    """
+    snapshot = context.snapshot
+    first_sample_token = context.scene(scene_name)['first_sample_token']
+    sample = snapshot.get('sample', first_sample_token)
+
+    # 获取相机传感器的外参
+    camera_token = sample['data'][camera_name]
+    sensor = snapshot.get('sample_data', camera_token)
+    sensor_calib = snapshot.get('calibrated_sensor', sensor['calibrated_sensor_token'])
+
+    translation = sensor_calib['translation']
+    rotation = sensor_calib['rotation']
+    camera_intrinsic = sensor_calib['camera_intrinsic']
+    extrinsic_matrix = se3.from_rt(se3.quaternion_to_matrix(np.asarray(rotation)), translation)
+    return {"first_sample_token": first_sample_token, "filename": sensor["filename"], "translation": translation, "rotation": rotation,
+            "matrix": extrinsic_matrix, "intrinsic": {"fx": camera_intrinsic[0][0], "fy": camera_intrinsic[1][1],
+                                                      "cx": camera_intrinsic[0][2], "cy": camera_intrinsic[1][2]}}
+
+
 if __name__ == '__main__':
+    from dataset_tutorial.nuscenes.runner import run_scenes
+
     dataset_root = "./v1.0-mini"  # 数据集路径
 
     # 生成colmap使用的数据格式
@@ -130,35 +156,18 @@ if __name__ == '__main__':
     # get_all_image_name(dataset_root, "./image_name")
 
     # 使用范例
-    nusc = NuScenes(version='v1.0-mini', dataroot=os.path.abspath(dataset_root), verbose=True)
-    print(nusc.list_scenes())
+    results, failures = run_scenes(camera_calibration, dataset_root, 'v1.0-mini', verbose=False)
     print("------------------------")
     scene_camera_matrix = dict()
     scene_camera_intrinsic = dict()
-    for scene in nusc.scene:
-        first_sample_token = scene['first_sample_token']
-        sample = nusc.get('sample', first_sample_token)
-        print(f"first_sample_token: {first_sample_token}")
-
-        # 获取前视相机传感器的外参
-        camera_token = sample['data']['CAM_FRONT']
-        sensor = nusc.get('sample_data', camera_token)
-        filename = sensor["filename"]
-        print(f"filename: {filename}")
-        sensor_calib = nusc.get('calibrated_sensor', sensor['calibrated_sensor_token'])
-
-        translation = sensor_calib['translation']
-        rotation = sensor_calib['rotation']
-        camera_intrinsic = sensor_calib['camera_intrinsic']
-        print(translation)
-        print(rotation)
-
-        extrinsic_matrix = fill_matrix(rotation, translation)
-        scene_camera_matrix[scene['name'][-4:]] = extrinsic_matrix.flatten()
-        scene_camera_intrinsic[scene['name'][-4:]] = {"fx": camera_intrinsic[0][0],
-                                                      "fy": camera_intrinsic[1][1],
-                                                      "cx": camera_intrinsic[0][2],
-                                                      "cy": camera_intrinsic[1][2]}
-
-        print('Scene ID:', scene['name'])
+    for scene_name, calib in results.items():
+        print(f"first_sample_token: {calib['first_sample_token']}")
+        print(f"filename: {calib['filename']}")
+        print(calib['translation'])
+        print(calib['rotation'])
+
+        scene_camera_matrix[scene_name[-4:]] = calib['matrix'].flatten()
+        scene_camera_intrinsic[scene_name[-4:]] = calib['intrinsic']
+
+        print('Scene ID:', scene_name)
         print('-----------------------------------')
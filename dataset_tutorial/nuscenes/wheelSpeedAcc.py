@@ -2,10 +2,9 @@ import os.path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from nuscenes.nuscenes import NuScenes
-from nuscenes.can_bus.can_bus_api import NuScenesCanBus
 
 from utils.smooth_vel import CubicSplineSmooth,MoveAverage,MoveAverageWithExpWeight
+from utils.derivative import calculate_acceleration
 
 """
 将nuscenes场景中wheel数据进行平滑，并使用滑动窗口计算加速度
@@ -22,84 +21,58 @@ def show_speed(wheel: np.ndarray, name=None):
     plt.show()
 
 
-# 滑动窗口计算加速度
-def calculate_acceleration(data):
-
-    # 计算时间差值
-    time_diff = np.diff(data[:, 0])
-    mean_time_diff = np.mean(time_diff)
-
-    # 计算加速度
-    left = 0
-    right = 0
-    accs = []
-    times = []
-    while right<len(data):
-        while(data[right, 0] - data[left, 0]<mean_time_diff):
-            right += 1
-            if right>=len(data):
-                break
-        if right >= len(data):
-            break
-        curr_time_diff = data[right, 0] - data[left, 0]
-        acc = (data[right, 1:] - data[left, 1:])/curr_time_diff
-        accs.append(acc[None,:])
-        times.append(np.array([[data[right, 0]]]))
-        left += 1
-    times = np.concatenate(times,axis=0)
-    accs = np.concatenate(accs,axis=0)
-
-    return np.concatenate([times, accs],axis=1)
-
-
-# 简单差分计算加速度
-def vel2acc(wheel_speed):
-    dt = wheel_speed[1:, 0] - wheel_speed[:-1, 0]
-    dt_speed = wheel_speed[1:, 1] - wheel_speed[:-1, 1]
-    acc = dt_speed / dt
-    acc = np.concatenate([wheel_speed[:-1, :1], acc[..., None]], axis=-1)
-    return acc
+def wheel_acceleration(context, scene_name):
+    """
+    单个场景的轮速平滑和加速度，可以直接传给runner.run_scenes
 
+    Returns:
+        dict: wheel_speed, wheel_cub, wheel_move3, wheel_move10, wheel_exp_weight为(n, 2)的[时间, 速度]，
+              wheel_acc, wheel_move10_acc为对应的加速度
+    """
+    # 这里得到的信息是全部序列的信息，不是sampel的信息
+    wheel_ = context.can_cache.get_columns(scene_name, 'zoe_veh_info', ['utime', 'FL_wheel_speed'])
 
-if __name__ == '__main__':
-    dataset_root = "./v1.0-mini" # 数据集路径
-    images_root = "dataset_tutorial/nuscenes/output" # 结果图片保存路径
+    wheel_speed = np.stack([wheel_['utime'], wheel_['FL_wheel_speed']], axis=-1).astype(np.float64)
+    wheel_speed[:,0] = (wheel_speed[:,0] - wheel_speed[0,0]) / 1e6
+    radius = 0.305  # Known Zoe wheel radius in meters.
+    circumference = 2 * np.pi * radius
+    wheel_speed[:,1:] *= (circumference / 60)
 
-    nusc = NuScenes(version='v1.0-mini', dataroot=dataset_root, verbose=True)
-    nusc_can = NuScenesCanBus(dataroot=dataset_root)
+    # 速度不同的平滑方式
+    wheel_cub = CubicSplineSmooth(wheel_speed)
+    wheel_move3 = MoveAverage(wheel_speed)
+    wheel_move10 = MoveAverage(wheel_speed, 10)
+    wheel_exp_weight = MoveAverageWithExpWeight(wheel_speed, 0.2)
 
-    for scene in nusc.scene:
-        scene_name = scene['name']
-        print(scene_name)
-        # nusc_can.print_all_message_stats(scene_name)
-        # 这里得到的信息是全部序列的信息，不是sampel的信息
-        wheel_ = nusc_can.get_messages(scene_name, 'zoe_veh_info')
+    wheel_acc = calculate_acceleration(wheel_speed)
+    wheel_move10_acc = calculate_acceleration(wheel_move10)
+    return {"wheel_speed": wheel_speed, "wheel_cub": wheel_cub, "wheel_move3": wheel_move3, "wheel_move10": wheel_move10,
+            "wheel_exp_weight": wheel_exp_weight, "wheel_acc": wheel_acc, "wheel_move10_acc": wheel_move10_acc}
 
-        wheel_speed = np.array([(m['utime'], m['FL_wheel_speed']) for m in wheel_])
-        wheel_speed[:,0] = (wheel_speed[:,0] - wheel_speed[0,0]) / 1e6
-        radius = 0.305  # Known Zoe wheel radius in meters.
-        circumference = 2 * np.pi * radius
-        wheel_speed[:,1:] *= (circumference / 60)
 
+if __name__ == '__main__':
+    from dataset_tutorial.nuscenes.runner import run_scenes
 
-        # 速度不同的平滑方式
-        wheel_cub = CubicSplineSmooth(wheel_speed)
-        wheel_move3 = MoveAverage(wheel_speed)
-        wheel_move10 = MoveAverage(wheel_speed, 10)
-        wheel_exp_weight = MoveAverageWithExpWeight(wheel_speed, 0.2)
+    dataset_root = "./v1.0-mini" # 数据集路径
+    images_root = "dataset_tutorial/nuscenes/output" # 结果图片保存路径
+
+    results, failures = run_scenes(wheel_acceleration, dataset_root, 'v1.0-mini')
+    for scene_name, result in results.items():
+        print(scene_name)
+        wheel_speed = result['wheel_speed']
 
         # 速度图像, 取消注释即可
         # legend = []
         # plt.plot(wheel_speed[:, 0], wheel_speed[:, 1])
         # legend.append('Wheel speed')
         #
-        # # plt.plot(wheel_cub[:, 0], wheel_cub[:, 1])
-        # # plt.plot(wheel_move3[:, 0], wheel_move3[:, 1])
+        # # plt.plot(result['wheel_cub'][:, 0], result['wheel_cub'][:, 1])
+        # # plt.plot(result['wheel_move3'][:, 0], result['wheel_move3'][:, 1])
         # #
-        # # plt.plot(wheel_move10[:, 0], wheel_move10[:, 1])
+        # # plt.plot(result['wheel_move10'][:, 0], result['wheel_move10'][:, 1])
         # # legend.append('wheel_move10')
         #
-        # # plt.plot(wheel_exp_weight[:, 0], wheel_exp_weight[:, 1])
+        # # plt.plot(result['wheel_exp_weight'][:, 0], result['wheel_exp_weight'][:, 1])
         # # legend.append('wheel_exp')
         #
         # plt.xlabel('Time in s')
@@ -114,10 +87,12 @@ if __name__ == '__main__':
 
         # 加速度图像
         legend = []
-        plt.plot(calculate_acceleration(wheel_speed)[:, 0], calculate_acceleration(wheel_speed)[:, 1])
+        wheel_acc = result['wheel_acc']
+        plt.plot(wheel_acc[:, 0], wheel_acc[:, 1])
         legend.append('Wheel speed')
 
-        plt.plot(calculate_acceleration(wheel_move10)[:, 0], calculate_acceleration(wheel_move10)[:, 1],alpha=0.5)
+        wheel_move10_acc = result['wheel_move10_acc']
+        plt.plot(wheel_move10_acc[:, 0], wheel_move10_acc[:, 1],alpha=0.5)
         legend.append('wheel_move10')
 
         plt.xlabel('Time in s')
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import cv2
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：frame_source.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+多线程预取解码的图片序列：工作线程提前解码到固定数量的预分配缓冲区中，按顺序输出，缓冲区用完时解码线程等待消费者
+"""
+
+# 解码时直接缩小的比例对应的imread标志
+_REDUCED = {
+    (0.5, False): cv2.IMREAD_REDUCED_COLOR_2, (0.25, False): cv2.IMREAD_REDUCED_COLOR_4, (0.125, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (0.5, True): cv2.IMREAD_REDUCED_GRAYSCALE_2, (0.25, True): cv2.IMREAD_REDUCED_GRAYSCALE_4, (0.125, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+class FrameSource:
+    def __init__(self, sources, timestamps=None, workers=4, capacity=8, grayscale=False, scale=1.0, copy=False):
+        """
+
+        Args:
+            sources: 图片路径列表，或者返回编码后字节的可下标对象（比如ShardReader）
+            timestamps: (n,) 每帧的时间戳，默认为帧号
+            workers: 解码线程数
+            capacity: 环形缓冲区的大小，即最多提前解码的帧数，至少为2
+            grayscale: 是否解码为灰度图
+            scale: 缩放比例，0.5, 0.25, 0.125时在解码时直接缩小
+            copy: False时输出的图片是缓冲区的视图，在取下一帧之后会被覆盖；True时输出副本
+        """
+        self.sources = sources
+        self.timestamps = np.arange(len(sources)) if timestamps is None else np.asarray(timestamps)
+        self.workers = workers
+        self.capacity = max(capacity, 2)
+        self.grayscale = grayscale
+        self.scale = scale
+        self.copy = copy
+        self._flags = _REDUCED.get((scale, grayscale), cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+        self._reduced = (scale, grayscale) in _REDUCED
+        self._buffers = None
+        self._executor = None
+        self.stats_seconds = {"stall": 0.0, "decode": 0.0, "wall": 0.0}
+        self.frames = 0
+
+    @classmethod
+    def from_timeline(cls, dataset_root, timeline, scene, channel="CAM_FRONT", key_only=False, **kwargs):
+        """
+        按时间顺序读取一个场景中一个相机的图片，timeline为dataset_tutorial.nuscenes.timeline.Timeline
+        """
+        frames = timeline.frames(scene, channel, key_only=key_only)
+        paths = [os.path.join(dataset_root, filename) for filename in timeline.filenames(frames)]
+        return cls(paths, timeline.timestamp[frames], **kwargs)
+
+    @classmethod
+    def from_shards(cls, reader, **kwargs):
+        """
+        读取tutorial.save_images以shards格式导出的图片，reader为utils.shard_archive.ShardReader
+        """
+        return cls(reader, np.asarray(reader.timestamps), **kwargs)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def _read(self, i):
+        source = self.sources[i]
+        if isinstance(source, (str, os.PathLike)):
+            image = cv2.imread(os.fspath(source), self._flags)
+        else:
+            image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), self._flags)
+        if image is None:
+            raise IOError(f"failed to decode frame {i}")
+        return image
+
+    def _shape(self, image):
+        if self._reduced or self.scale == 1.0:
+            return image.shape
+        return (int(round(image.shape[0] * self.scale)), int(round(image.shape[1] * self.scale))) + image.shape[2:]
+
+    def _decode(self, i, slot):
+        """
+        在工作线程中解码第i帧到缓冲区slot
+        """
+        start = time.perf_counter()
+        self._store(self._read(i), self._buffers[slot])
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _store(image, buffer):
+        if image.shape[:2] == buffer.shape[:2]:
+            np.copyto(buffer, image)
+        else:
+            cv2.resize(image, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_AREA)
+
+    def __iter__(self):
+        """
+        Yields:
+            (帧号, 时间戳, 图片)
+        """
+        n = len(self.sources)
+        if n == 0:
+            return
+        wall_start = time.perf_counter()
+        # 用第一帧确定缓冲区的大小，之后的帧假定大小相同
+        first = self._read(0)
+        shape = self._shape(first)
+        self._buffers = np.empty((self.capacity,) + shape, dtype=first.dtype)
+
+        self._store(first, self._buffers[0])
+        done = Future()
+        done.set_result(time.perf_counter() - wall_start)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {0: (done, 0)}  # 帧号 -> (future, slot)
+        try:
+            # 同时在解码或者等待消费的帧不超过capacity，缓冲区满时停止提交，形成背压
+            for i in range(1, min(self.capacity, n)):
+                pending[i] = (self._executor.submit(self._decode, i, i), i)
+            for i in range(n):
+                future, slot = pending.pop(i)
+                start = time.perf_counter()
+                self.stats_seconds["decode"] += future.result()
+                self.stats_seconds["stall"] += time.perf_counter() - start
+                frame = self._buffers[slot]
+                self.frames += 1
+                yield i, self.timestamps[i], frame.copy() if self.copy else frame
+                # 消费者取下一帧时第i帧的缓冲区已经可以复用
+                if i + self.capacity < n:
+                    pending[i + self.capacity] = (self._executor.submit(self._decode, i + self.capacity, slot), slot)
+        finally:
+            for future, _ in pending.values():
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self.stats_seconds["wall"] += time.perf_counter() - wall_start
+
+    def stats(self):
+        """
+        stall_ratio接近1说明消费者大部分时间在等待解码（I/O或解码瓶颈），接近0说明瓶颈在消费者的计算
+
+        Returns:
+            dict: frames, fps（消费速度）, decode_ms（单帧平均解码耗时）, decode_fps（所有线程合计的解码能力）,
+            stall_seconds, stall_ratio
+        """
+        seconds = self.stats_seconds
+        frames = max(self.frames, 1)
+        return {"frames": self.frames,
+                "fps": self.frames / seconds["wall"] if seconds["wall"] > 0 else 0.0,
+                "decode_ms": seconds["decode"] * 1000 / frames,
+                "decode_fps": self.workers * frames / seconds["decode"] if seconds["decode"] > 0 else 0.0,
+                "stall_seconds": seconds["stall"],
+                "stall_ratio": seconds["stall"] / seconds["wall"] if seconds["wall"] > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    from dataset_tutorial.nuscenes.timeline import load_timeline
+
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    timeline = load_timeline(dataset_root, 'v1.0-mini')
+    source = FrameSource.from_timeline(dataset_root, timeline, timeline.scene_names[0], "CAM_FRONT", grayscale=True, scale=0.5)
+    for index, timestamp, image in source:
+        pass
+    print(source.stats())
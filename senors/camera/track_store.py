@@ -0,0 +1,214 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+import shutil
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：track_store.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+列式存储的特征点轨迹：所有观测保存在连续数组中(track, frame, uv, status)，按帧追加，
+按帧查询直接切片，按轨迹查询使用按需重建的CSR索引
+"""
+
+COLUMNS = {"track": np.int64, "frame": np.int32, "uv": np.float32, "status": np.uint8}
+
+
+class TrackStore:
+    def __init__(self, chunk_size=1 << 16):
+        """
+
+        Args:
+            chunk_size: 数组每次至少增长的观测数
+        """
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._columns = {name: np.empty((0, 2) if name == "uv" else 0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._frame_ptr = [0]  # 第k帧的观测为[_frame_ptr[k], _frame_ptr[k + 1])
+        self._track_index = None  # (order, ptr)，追加或裁剪后失效
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def num_frames(self):
+        return len(self._frame_ptr) - 1
+
+    def _reserve(self, size):
+        capacity = len(self._columns["track"])
+        # load(mmap=True)得到的只读数组在第一次追加时复制，即使这一帧没有观测
+        if size <= capacity and self._columns["track"].flags.writeable:
+            return
+        # 按块增长，块大小随容量增大，追加的均摊复杂度为O(1)
+        capacity = max(size, capacity + max(self.chunk_size, capacity // 2))
+        for name, column in self._columns.items():
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+
+    def append(self, frame, ids, points, status=None):
+        """
+        追加一帧的所有观测，帧号需要不小于已经追加的帧
+
+        Args:
+            frame: 帧号
+            ids: (n,) 轨迹id
+            points: (n, 2) 像素坐标
+            status: (n,) 或标量，默认为1
+        """
+        if frame < self.num_frames - 1:
+            raise ValueError(f"frame {frame} is before the last appended frame {self.num_frames - 1}")
+        n = len(ids)
+        start = self.size
+        self._reserve(start + n)
+        columns = self._columns
+        columns["track"][start:start + n] = ids
+        columns["frame"][start:start + n] = frame
+        columns["uv"][start:start + n] = points
+        columns["status"][start:start + n] = 1 if status is None else status
+        self.size = start + n
+        # 中间没有观测的帧也占一个位置
+        self._frame_ptr.extend([start] * (frame + 1 - self.num_frames))
+        self._frame_ptr[frame + 1] = self.size
+        self._track_index = None
+
+    def arrays(self):
+        """
+        Returns:
+            dict: track (n,), frame (n,), uv (n, 2), status (n,)，均为内部数组的视图，不复制
+        """
+        return {name: column[:self.size] for name, column in self._columns.items()}
+
+    def frame_ptr(self):
+        return np.asarray(self._frame_ptr, dtype=np.int64)
+
+    def in_frame(self, frame):
+        """
+        Returns:
+            第frame帧的所有观测，dict，内部数组的视图
+        """
+        if frame >= self.num_frames:
+            start = stop = self.size
+        else:
+            start, stop = self._frame_ptr[frame], self._frame_ptr[frame + 1]
+        return {name: column[start:stop] for name, column in self._columns.items()}
+
+    def _index(self):
+        if self._track_index is None:
+            track = self._columns["track"][:self.size]
+            # 观测已经按帧排序，稳定排序后每条轨迹内部仍按帧排序
+            order = np.argsort(track, kind='stable')
+            num_tracks = int(track.max()) + 1 if self.size else 0
+            ptr = np.zeros(num_tracks + 1, dtype=np.int64)
+            np.cumsum(np.bincount(track, minlength=num_tracks), out=ptr[1:])
+            self._track_index = (order, ptr)
+        return self._track_index
+
+    def of_track(self, track):
+        """
+        Returns:
+            轨迹track按帧排序的所有观测，dict
+        """
+        order, ptr = self._index()
+        rows = order[ptr[track]:ptr[track + 1]] if track + 1 < len(ptr) else order[:0]
+        return {name: column[rows] for name, column in self._columns.items()}
+
+    def track_lengths(self):
+        """
+        Returns:
+            (num_tracks,) 每条轨迹的观测数
+        """
+        _, ptr = self._index()
+        return np.diff(ptr)
+
+    def trim(self, min_length=2, max_length=None):
+        """
+        删除观测数不在[min_length, max_length]内的轨迹，轨迹id保持不变
+
+        Returns:
+            删除的观测数
+        """
+        lengths = self.track_lengths()
+        valid = lengths >= min_length
+        if max_length is not None:
+            valid &= lengths <= max_length
+        arrays = self.arrays()
+        keep = valid[arrays["track"]]
+        removed = int(self.size - keep.sum())
+        if removed == 0:
+            return 0
+        # 删除后按帧号重新计算每帧的起止位置
+        self._columns = {name: column[keep] for name, column in arrays.items()}
+        self.size = len(self._columns["track"])
+        self._frame_ptr = np.searchsorted(self._columns["frame"], np.arange(self.num_frames + 1), side='left').tolist()
+        self._track_index = None
+        return removed
+
+    def save(self, path):
+        """
+        保存为目录，每列一个.npy
+        """
+        tmp_path = path + f".tmp{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, column in self.arrays().items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), column)
+        np.save(os.path.join(tmp_path, "frame_ptr.npy"), self.frame_ptr())
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding='utf8') as fp:
+            json.dump({"size": self.size, "num_frames": self.num_frames}, fp)
+        # 先写临时目录再替换，已有的目录先移走，不会出现删除到一半的目录；已经load(mmap=True)的旧数据仍然可以读
+        stale_path = None
+        if os.path.exists(path):
+            stale_path = path + f".stale{os.getpid()}"
+            try:
+                os.replace(path, stale_path)
+            except OSError:
+                stale_path = None  # 已被其他进程移走
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # 目标目录非空，其他进程同时保存到了同一个目录，保留先写完的
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        if stale_path is not None:
+            shutil.rmtree(stale_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True, chunk_size=1 << 16):
+        """
+        Args:
+            mmap: 是否以只读内存映射的方式打开，之后追加时会复制到新的数组
+        """
+        store = cls(chunk_size)
+        mode = 'r' if mmap else None
+        store._columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in COLUMNS}
+        store.size = len(store._columns["track"])
+        store._frame_ptr = np.load(os.path.join(path, "frame_ptr.npy")).tolist()
+        return store
+
+
+if __name__ == "__main__":
+    import time
+
+    num_frames, per_frame = 14400, 300  # 20分钟12Hz，每帧300个点
+    store = TrackStore()
+    rng = np.random.default_rng(0)
+    ids = np.arange(per_frame)
+    next_id = per_frame
+    start = time.perf_counter()
+    for frame in range(num_frames):
+        # 每帧约10%的轨迹结束并由新轨迹代替
+        lost = rng.random(per_frame) < 0.1
+        ids[lost] = np.arange(next_id, next_id + lost.sum())
+        next_id += lost.sum()
+        store.append(frame, ids, rng.uniform(0, 1600, (per_frame, 2)))
+    print(f"append {len(store)} observations in {time.perf_counter() - start:.2f}s, "
+          f"{sum(c.nbytes for c in store.arrays().values()) / 1e6:.1f} MB")
+
+    start = time.perf_counter()
+    lengths = store.track_lengths()
+    removed = store.trim(min_length=3)
+    print(f"{len(lengths)} tracks, trim {removed} observations in {time.perf_counter() - start:.2f}s")
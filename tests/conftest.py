@@ -0,0 +1,12 @@
+# -*- coding: UTF-8 -*-
+import os
+import sys
+
+# Project ：SLAMBox
+# File    ：conftest.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+# 仓库没有打包，测试直接从仓库根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+
+import pytest
+
+from dataset_tutorial.nuscenes.runner import run_scenes
+
+# Project ：SLAMBox
+# File    ：test_runner.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+runner.run_scenes：用合成的最小元数据验证结果顺序、单个场景失败的隔离、断点续跑以及检查点按函数和版本区分
+"""
+
+VERSION = 'v1.0-test'
+SCENES = ['scene-0003', 'scene-0001', 'scene-0002']  # 故意不按名字排序，结果应保持scene表的顺序
+
+
+def _make_dataset(root):
+    """
+    只包含scene和sample两个表有内容的元数据，其他表为空
+    """
+    meta_root = os.path.join(root, VERSION)
+    os.makedirs(meta_root)
+    scenes = [{"token": f"{i:032x}", "log_token": "", "nbr_samples": i + 1, "first_sample_token": f"{100 + i:032x}",
+               "last_sample_token": f"{100 + i:032x}", "name": name, "description": ""} for i, name in enumerate(SCENES)]
+    samples = [{"token": f"{100 + i:032x}", "timestamp": 1000 * i, "prev": "", "next": "", "scene_token": f"{i:032x}"}
+               for i in range(len(SCENES))]
+    tables = {'scene': scenes, 'sample': samples, 'sample_data': [], 'calibrated_sensor': [], 'ego_pose': [], 'sensor': []}
+    for name, records in tables.items():
+        with open(os.path.join(meta_root, f"{name}.json"), "w") as fp:
+            json.dump(records, fp)
+    return str(root)
+
+
+def _describe(context, scene_name):
+    # 每次调用记录一行，用来检查哪些场景被重跑；存在fail-{scene}文件时故意失败
+    with open(os.path.join(context.dataset_root, "calls.txt"), "a") as fp:
+        fp.write(scene_name + "\n")
+    if os.path.exists(os.path.join(context.dataset_root, f"fail-{scene_name}")):
+        raise RuntimeError(f"{scene_name} failed on purpose")
+    return {"nbr_samples": context.scene(scene_name)['nbr_samples'], "version": context.version}
+
+
+def _name_length(context, scene_name):
+    return len(scene_name)
+
+
+def _calls(dataset_root):
+    path = os.path.join(dataset_root, "calls.txt")
+    if not os.path.exists(path):
+        return []
+    with open(path) as fp:
+        return fp.read().split()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_order_and_failure(tmp_path, workers):
+    dataset_root = _make_dataset(tmp_path)
+    open(os.path.join(dataset_root, "fail-scene-0001"), "w").close()
+
+    results, failures = run_scenes(_describe, dataset_root, VERSION, workers=workers, verbose=False)
+    assert list(results) == ['scene-0003', 'scene-0002']
+    assert results['scene-0003'] == {"nbr_samples": 1, "version": VERSION}
+    assert results['scene-0002'] == {"nbr_samples": 3, "version": VERSION}
+    assert list(failures) == ['scene-0001']
+    assert "failed on purpose" in failures['scene-0001']
+
+
+def test_in_process_keeps_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv("MPLBACKEND", raising=False)
+    dataset_root = _make_dataset(tmp_path)
+    run_scenes(_describe, dataset_root, VERSION, workers=1, verbose=False)
+    assert "MPLBACKEND" not in os.environ
+
+
+def test_resume(tmp_path):
+    dataset_root = _make_dataset(tmp_path)
+    checkpoint = os.path.join(dataset_root, "checkpoint")
+    marker = os.path.join(dataset_root, "fail-scene-0001")
+    open(marker, "w").close()
+
+    results, failures = run_scenes(_describe, dataset_root, VERSION, workers=2, checkpoint=checkpoint, verbose=False)
+    assert list(failures) == ['scene-0001']
+    assert sorted(_calls(dataset_root)) == sorted(SCENES)
+
+    # 只重跑上次失败的场景，结果仍按scene表的顺序
+    os.remove(marker)
+    results, failures = run_scenes(_describe, dataset_root, VERSION, workers=2, checkpoint=checkpoint, verbose=False)
+    assert failures == {}
+    assert list(results) == SCENES
+    assert results['scene-0001'] == {"nbr_samples": 2, "version": VERSION}
+    assert sorted(_calls(dataset_root)) == sorted(SCENES + ['scene-0001'])
+
+    # 全部完成后不再调用
+    run_scenes(_describe, dataset_root, VERSION, workers=2, checkpoint=checkpoint, verbose=False)
+    assert len(_calls(dataset_root)) == len(SCENES) + 1
+
+
+def test_checkpoint_keyed_by_function(tmp_path):
+    dataset_root = _make_dataset(tmp_path)
+    checkpoint = os.path.join(dataset_root, "checkpoint")
+
+    run_scenes(_describe, dataset_root, VERSION, workers=1, checkpoint=checkpoint, verbose=False)
+    # 同一个检查点目录换一个函数，不能读到_describe的结果
+    results, _ = run_scenes(_name_length, dataset_root, VERSION, workers=1, checkpoint=checkpoint, verbose=False)
+    assert results == {name: len(name) for name in SCENES}
+
+    for func in (_describe, _name_length):
+        func_dir = os.path.join(checkpoint, VERSION, f"{func.__module__}.{func.__qualname__}")
+        assert sorted(os.listdir(func_dir)) == sorted(f"{name}.pkl" for name in SCENES)
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import numpy as np
+
+from senors.camera.track_store import TrackStore
+
+# Project ：SLAMBox
+# File    ：test_track_store.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+TrackStore：追加 -> 按帧/按轨迹查询 -> 裁剪 -> 保存/内存映射读取 -> 读取后继续追加
+"""
+
+
+def _fill(store):
+    # 轨迹0跨越0-3帧，轨迹1只有1帧，轨迹2跨越1-2帧，第2帧没有轨迹1
+    store.append(0, [0, 1], [[0, 0], [1, 1]])
+    store.append(1, [0, 2], [[0, 1], [2, 1]])
+    store.append(2, [2, 0], [[2, 2], [0, 2]], status=[1, 0])
+    store.append(3, [0], [[0, 3]])
+
+
+def test_round_trip(tmp_path):
+    store = TrackStore(chunk_size=2)  # 小块，覆盖多次增长
+    _fill(store)
+    assert len(store) == 7 and store.num_frames == 4
+
+    frame = store.in_frame(2)
+    np.testing.assert_array_equal(frame["track"], [2, 0])
+    np.testing.assert_array_equal(frame["status"], [1, 0])
+    assert len(store.in_frame(10)["track"]) == 0
+
+    track = store.of_track(0)
+    np.testing.assert_array_equal(track["frame"], [0, 1, 2, 3])
+    np.testing.assert_array_equal(track["uv"][:, 1], [0, 1, 2, 3])
+    np.testing.assert_array_equal(store.track_lengths(), [4, 1, 2])
+
+    # 轨迹1只有一个观测，被删除，id不变
+    assert store.trim(min_length=2) == 1
+    np.testing.assert_array_equal(store.in_frame(0)["track"], [0])
+    np.testing.assert_array_equal(store.of_track(2)["frame"], [1, 2])
+    assert len(store.of_track(1)["track"]) == 0
+    np.testing.assert_array_equal(store.frame_ptr(), [0, 1, 3, 5, 6])
+
+    path = str(tmp_path / "tracks")
+    store.save(path)
+    # 覆盖已有的目录，不留下临时目录
+    store.save(path)
+    assert os.listdir(tmp_path) == ["tracks"]
+
+    loaded = TrackStore.load(path, mmap=True)
+    assert isinstance(loaded.arrays()["track"], np.memmap)
+    for name, column in store.arrays().items():
+        np.testing.assert_array_equal(loaded.arrays()[name], column)
+    np.testing.assert_array_equal(loaded.frame_ptr(), store.frame_ptr())
+    np.testing.assert_array_equal(loaded.of_track(0)["frame"], [0, 1, 2, 3])
+
+    # 读取后继续追加：空帧和非空帧都复制到可写数组，不修改磁盘上的文件
+    loaded.append(4, np.empty(0, dtype=np.int64), np.empty((0, 2)))
+    loaded.append(5, [0, 3], [[0, 5], [3, 5]])
+    assert loaded.num_frames == 6 and len(loaded) == 8
+    assert len(loaded.in_frame(4)["track"]) == 0
+    np.testing.assert_array_equal(loaded.of_track(0)["frame"], [0, 1, 2, 3, 5])
+    np.testing.assert_array_equal(loaded.of_track(3)["uv"], [[3, 5]])
+    assert len(TrackStore.load(path, mmap=True)) == 6
@@ -0,0 +1,59 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+import pytest
+
+from utils.traj_io import read_tum, write_tum, parse_text
+
+# Project ：SLAMBox
+# File    ：test_traj_io.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+traj_io：注释、空行、只包含空白字符的行，以及按块解析时块边界落在这些行上
+"""
+
+ROWS = [[1.0, 0, 0, 0, 0, 0, 0, 1], [2.0, 1, 0, 0, 0, 0, 0, 1], [3.0, 2, 0, 0, 0, 0, 0, 1]]
+
+
+def _line(row):
+    return " ".join(str(v) for v in row)
+
+
+@pytest.mark.parametrize("text", [
+    f"{_line(ROWS[0])}\n   \n{_line(ROWS[1])}\n{_line(ROWS[2])}\n",  # 中间一行只有空格
+    f"\t\n{_line(ROWS[0])}\n{_line(ROWS[1])}\n \r\n{_line(ROWS[2])}",  # 开头和中间是空白行，结尾没有换行
+    f"# timestamp tx ty tz qx qy qz qw\n{_line(ROWS[0])}\n\n{_line(ROWS[1])}\n  # comment\n{_line(ROWS[2])}\n",
+    f"{_line(ROWS[0])}\r\n{_line(ROWS[1])}\r\n{_line(ROWS[2])}\r\n",
+])
+@pytest.mark.parametrize("cache", [False, True])
+def test_read_tum_skips_blank_lines(tmp_path, text, cache):
+    path = str(tmp_path / "traj.txt")
+    with open(path, "w", newline="") as fp:
+        fp.write(text)
+    np.testing.assert_array_equal(read_tum(path, cache=cache), ROWS)
+    # 小块解析，块边界落在空白行和注释上
+    np.testing.assert_array_equal(parse_text(path, 8, chunk_bytes=7), ROWS)
+
+
+def test_only_comments(tmp_path):
+    path = str(tmp_path / "traj.txt")
+    with open(path, "w") as fp:
+        fp.write("# empty trajectory\n   \n")
+    assert read_tum(path, cache=False).shape == (0, 8)
+
+
+def test_wrong_columns(tmp_path):
+    path = str(tmp_path / "traj.txt")
+    with open(path, "w") as fp:
+        fp.write(f"{_line(ROWS[0])}\n   \n1 2 3\n")
+    with pytest.raises(ValueError):
+        read_tum(path, cache=False)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "traj.txt")
+    traj = np.random.default_rng(0).normal(size=(1000, 8))
+    write_tum(path, traj, chunk_rows=64)
+    np.testing.assert_allclose(read_tum(path), traj, atol=1e-6)
@@ -0,0 +1,71 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+import pytest
+
+from utils.wheel_imu_ekf import WheelImuEKF
+
+# Project ：SLAMBox
+# File    ：test_wheel_imu_ekf.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+WheelImuEKF的run和step各自展开了同一套预测/更新，两者的结果必须逐位相同
+"""
+
+
+def _samples(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.cumsum(rng.uniform(0.005, 0.015, n))
+    v = 10 + np.sin(time * 0.1)
+    w_true = 0.1 * np.sin(time * 0.05)
+    w_wheel = w_true + rng.normal(0, 0.02, n)
+    gyro = w_true + 0.02 + rng.normal(0, 0.005, n)
+    gyro[rng.random(n) < 0.3] = np.nan  # 缺失的陀螺仪测量
+    gyro[:5] = np.nan
+    return time, v, w_wheel, gyro
+
+
+def _assert_same(a: WheelImuEKF, b: WheelImuEKF):
+    assert a._x == b._x
+    assert a._p == b._p
+    assert a.time == b.time
+
+
+@pytest.mark.parametrize("missing", ["nan", "none"])
+def test_step_matches_run(missing):
+    time, v, w_wheel, gyro = _samples()
+    ekf_run, ekf_step = WheelImuEKF(), WheelImuEKF()
+    out = ekf_run.run(time, v, w_wheel, gyro)
+
+    steps = np.empty_like(out)
+    for i, (t, vi, wi, gi) in enumerate(zip(time.tolist(), v.tolist(), w_wheel.tolist(), gyro.tolist())):
+        # 没有测量可以用nan或None表示
+        steps[i] = ekf_step.step(t, vi, wi, None if missing == "none" and np.isnan(gi) else gi)
+
+    np.testing.assert_array_equal(out, steps)
+    assert out.tobytes() == steps.tobytes()
+    _assert_same(ekf_run, ekf_step)
+    np.testing.assert_array_equal(ekf_run.P, ekf_step.P)
+    np.testing.assert_array_equal(ekf_run.state, out[-1])
+
+
+def test_run_then_step_continues():
+    time, v, w_wheel, gyro = _samples(seed=1)
+    whole = WheelImuEKF()
+    whole.run(time, v, w_wheel, gyro)
+
+    # 前一半用run，后一半用step，从同一个状态继续
+    half = len(time) // 2
+    mixed = WheelImuEKF()
+    mixed.run(time[:half], v[:half], w_wheel[:half], gyro[:half])
+    for t, vi, wi, gi in zip(time[half:].tolist(), v[half:].tolist(), w_wheel[half:].tolist(), gyro[half:].tolist()):
+        mixed.step(t, vi, wi, gi)
+    _assert_same(whole, mixed)
+
+
+def test_gyro_bias_converges():
+    time, v, w_wheel, gyro = _samples(n=20000)
+    out = WheelImuEKF().run(time, v, w_wheel, gyro)
+    assert abs(out[-1, 4] - 0.02) < 0.003
@@ -0,0 +1,103 @@
+# -*- coding: UTF-8 -*-
+import os
+import struct
+
+import numpy as np
+
+from utils import se3
+
+# Project ：SLAMBox
+# File    ：colmap.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+COLMAP二进制模型(cameras.bin, images.bin, points3D.bin)的写入，格式与COLMAP的read_write_model.py一致
+"""
+
+CAMERA_MODEL_IDS = {"SIMPLE_PINHOLE": 0, "PINHOLE": 1, "SIMPLE_RADIAL": 2, "RADIAL": 3, "OPENCV": 4}
+
+_IMAGE_DTYPE = np.dtype([('image_id', '<i4'), ('qvec', '<f8', 4), ('tvec', '<f8', 3), ('camera_id', '<i4')])
+
+
+def write_cameras_bin(path, camera_ids, model, widths, heights, params):
+    """
+    写入cameras.bin，所有相机使用同一种模型
+
+    Args:
+        camera_ids: (m,)
+        model: 相机模型名，比如PINHOLE
+        widths, heights: (m,)
+        params: (m, p)，PINHOLE为fx, fy, cx, cy
+    """
+    params = np.asarray(params, dtype=np.float64)
+    dtype = np.dtype([('camera_id', '<i4'), ('model_id', '<i4'), ('width', '<u8'), ('height', '<u8'), ('params', '<f8', params.shape[1])])
+    records = np.empty(len(params), dtype=dtype)
+    records['camera_id'] = camera_ids
+    records['model_id'] = CAMERA_MODEL_IDS[model]
+    records['width'] = widths
+    records['height'] = heights
+    records['params'] = params
+    with open(path, "wb") as fp:
+        fp.write(struct.pack('<Q', len(records)))
+        fp.write(records.tobytes())
+
+
+def write_images_bin(path, image_ids, qvecs, tvecs, camera_ids, names):
+    """
+    写入不带2D特征点的images.bin
+
+    Args:
+        image_ids: (n,)
+        qvecs: (n, 4) 世界到相机的旋转(w, x, y, z)
+        tvecs: (n, 3) 世界到相机的平移
+        camera_ids: (n,)
+        names: 长度为n的图片相对路径列表
+    """
+    records = np.empty(len(names), dtype=_IMAGE_DTYPE)
+    records['image_id'] = image_ids
+    records['qvec'] = qvecs
+    records['tvec'] = tvecs
+    records['camera_id'] = camera_ids
+    fixed = records.tobytes()
+    size = _IMAGE_DTYPE.itemsize
+    no_points = struct.pack('<Q', 0)
+    with open(path, "wb") as fp:
+        fp.write(struct.pack('<Q', len(records)))
+        fp.write(b"".join(fixed[i * size:(i + 1) * size] + name.encode('utf8') + b"\0" + no_points for i, name in enumerate(names)))
+
+
+def write_points3D_bin(path):
+    """
+    写入空的points3D.bin
+    """
+    with open(path, "wb") as fp:
+        fp.write(struct.pack('<Q', 0))
+
+
+def write_model(model_root, cameras: dict, images: dict):
+    """
+    写入已知位姿、没有三维点的模型，可直接用于colmap point_triangulator
+
+    Args:
+        cameras: camera_ids, model, widths, heights, params
+        images: image_ids, qvecs, tvecs, camera_ids, names
+    """
+    os.makedirs(model_root, exist_ok=True)
+    write_cameras_bin(os.path.join(model_root, "cameras.bin"), **cameras)
+    write_images_bin(os.path.join(model_root, "images.bin"), **images)
+    write_points3D_bin(os.path.join(model_root, "points3D.bin"))
+
+
+def world_to_camera(pose: np.ndarray):
+    """
+    相机到世界的位姿转换为COLMAP使用的世界到相机的四元数和平移
+
+    Args:
+        pose: (n, 4, 4) 相机到世界
+    Returns:
+        qvecs: (n, 4), tvecs: (n, 3)
+    """
+    T_cw = se3.inverse(pose)
+    return se3.matrix_to_quaternion(T_cw[:, :3, :3]), T_cw[:, :3, 3]
@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+from collections import OrderedDict
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：derivative.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+时间序列的数值微分，比如由轮速计算加速度
+"""
+
+_ACC_CACHE = OrderedDict()
+_ACC_CACHE_SIZE = 16
+
+
+def _window_right(time: np.ndarray, duration, min_samples):
+    """
+    对每个left找到第一个满足 time[right] - time[left] >= duration 且 right - left >= min_samples 的right，
+    不存在时为len(time)
+    """
+    n = len(time)
+    left = np.arange(n)
+    right = np.searchsorted(time, time + duration, side='left')
+
+    # time + duration存在舍入误差，按照 time[right] - time[left] >= duration 的定义修正一次
+    prev = np.maximum(right - 1, left)
+    right = np.where((prev > left) & (time[prev] - time[left] >= duration), prev, right)
+    valid = right < n
+    short = valid & (time[np.minimum(right, n - 1)] - time < duration)
+    right = right + short
+
+    return np.maximum(right, left + min_samples)
+
+
+# 滑动窗口计算加速度
+def calculate_acceleration(data: np.ndarray, duration=None, min_samples=1, key=None):
+    """
+    滑动窗口差分，acc = (v[right] - v[left]) / (t[right] - t[left])，窗口右端点由一次有序查找得到
+
+    Args:
+        data: (n, 1+k)，第一列为时间（递增），其余k列为速度
+        duration: 窗口的最小时长，默认为平均采样间隔
+        min_samples: 窗口内的最少采样间隔数
+        key: 调用方给出的数据标识，比如(scene_name, 'FL_wheel_speed')，需要可哈希；给出时缓存结果，
+             同一个key和窗口参数再次调用时直接返回缓存。不对data本身求哈希，那和重新计算一样是O(n)，
+             data变化时需要换一个key。缓存的结果为只读数组，需要修改时先copy
+    Returns:
+        acc: (m, 1+k)，第一列为窗口右端点的时间
+    """
+    if key is not None:
+        key = (key, duration, min_samples)
+        if key in _ACC_CACHE:
+            _ACC_CACHE.move_to_end(key)
+            return _ACC_CACHE[key]
+
+    time = data[:, 0]
+    if duration is None:
+        # 计算时间差值
+        duration = np.mean(np.diff(time))
+
+    right = _window_right(time, duration, min_samples)
+    left = np.flatnonzero(right < len(time))
+    right = right[left]
+
+    curr_time_diff = time[right] - time[left]
+    accs = (data[right, 1:] - data[left, 1:]) / curr_time_diff[:, None]
+    acc = np.concatenate([time[right, None], accs], axis=1)
+
+    if key is not None:
+        acc.setflags(write=False)
+        _ACC_CACHE[key] = acc
+        if len(_ACC_CACHE) > _ACC_CACHE_SIZE:
+            _ACC_CACHE.popitem(last=False)
+    return acc
+
+
+def _three_point_weights(d: np.ndarray):
+    """
+    三点二次插值在求导点处的一阶、二阶导数权重
+
+    Args:
+        d: (n, 3)，三个节点相对求导点的时间
+    Returns:
+        w1, w2: (n, 3)
+    """
+    d0, d1, d2 = d[:, 0], d[:, 1], d[:, 2]
+    den = np.stack([(d0 - d1) * (d0 - d2), (d1 - d0) * (d1 - d2), (d2 - d0) * (d2 - d1)], axis=-1)
+    num = -np.stack([d1 + d2, d0 + d2, d0 + d1], axis=-1)
+    return num / den, 2 / den
+
+
+def _stencil_derivative(time, values, orders, method):
+    n = len(time)
+    idx = np.arange(n)
+    if method == "central":
+        # 内部点使用(i-1, i, i+1)，两端使用单侧的三个点
+        start = np.clip(idx - 1, 0, n - 3)
+    else:
+        start = np.minimum(idx, n - 3)
+    nodes = start[:, None] + np.arange(3)
+    w1, w2 = _three_point_weights(time[nodes] - time[:, None])
+
+    results = []
+    for order in orders:
+        if order == 1 and method == "forward":
+            # 两点前向差分，最后一个点使用后向差分
+            right = np.minimum(idx + 1, n - 1)
+            left = right - 1
+            results.append((values[right] - values[left]) / (time[right] - time[left])[:, None])
+        else:
+            w = w1 if order == 1 else w2
+            results.append(np.einsum('nj,njk->nk', w, values[nodes]))
+    return results
+
+
+def _savgol_derivative(time, values, orders, window, polyorder):
+    """
+    非均匀采样下的Savitzky–Golay滤波：每个点在其附近window个采样点上做polyorder阶多项式最小二乘拟合，
+    取拟合多项式在该点处的导数。所有点的正规方程一次批量求解
+    """
+    n = len(time)
+    assert window % 2 == 1 and polyorder < window <= n
+    start = np.clip(np.arange(n) - window // 2, 0, n - window)
+    nodes = start[:, None] + np.arange(window)
+
+    # 用平均采样间隔归一化时间，改善正规方程的条件数
+    h = (time[-1] - time[0]) / (n - 1)
+    x = (time[nodes] - time[:, None]) / h  # (n, window)
+    V = x[..., None] ** np.arange(polyorder + 1)  # (n, window, p+1)
+    VtV = np.einsum('nwi,nwj->nij', V, V)
+    coeff = np.linalg.solve(VtV, np.swapaxes(V, 1, 2))  # (n, p+1, window)
+
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)[start]  # (n, k, window)
+    results = []
+    for order in orders:
+        assert order <= polyorder
+        w = coeff[:, order] * (np.prod(np.arange(1, order + 1)) / h ** order)
+        results.append(np.einsum('nw,nkw->nk', w, windows))
+    return results
+
+
+def numerical_derivative(data: np.ndarray, order=1, method="central", window=7, polyorder=2):
+    """
+    非均匀时间戳下对所有列同时求数值导数，结果与输入的时间对齐
+
+    Args:
+        data: (n, 1+k)，第一列为时间（递增），其余k列为待求导的数据，比如四个轮速或IMU三轴
+        order: 导数阶数，1或2，也可以是(1, 2)一次求出多阶
+        method: forward: 一阶为两点前向差分，二阶为三点前向差分
+                central: 三点中心差分（非均匀步长的二阶精度公式），两端使用单侧三点公式
+                savgol: 非均匀采样的Savitzky–Golay局部多项式拟合
+        window: savgol的窗口采样点数（奇数）
+        polyorder: savgol的多项式阶数
+    Returns:
+        derivative: (n, 1+k)，第一列为时间；order为序列时返回对应的tuple
+    """
+    time = data[:, 0]
+    values = data[:, 1:]
+    orders = (order,) if np.isscalar(order) else tuple(order)
+    assert set(orders) <= {1, 2} and len(time) >= 3
+
+    if method in ("forward", "central"):
+        results = _stencil_derivative(time, values, orders, method)
+    elif method == "savgol":
+        results = _savgol_derivative(time, values, orders, window, polyorder)
+    else:
+        raise ValueError("method must be forward, central or savgol")
+
+    results = tuple(np.concatenate([time[:, None], r], axis=-1) for r in results)
+    return results[0] if np.isscalar(order) else results
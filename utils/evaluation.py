@@ -0,0 +1,208 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+from utils.traj_io import tum_to_pose
+
+# Project ：SLAMBox
+# File    ：evaluation.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+轨迹精度评估：时间戳关联、Umeyama对齐、绝对轨迹误差(ATE)和相对位姿误差(RPE)，全部按位姿批量计算
+"""
+
+
+def statistics(errors: np.ndarray):
+    errors = np.asarray(errors)
+    if len(errors) == 0:
+        return {"rmse": np.nan, "mean": np.nan, "median": np.nan, "std": np.nan, "min": np.nan, "max": np.nan, "count": 0}
+    return {"rmse": float(np.sqrt(np.mean(errors ** 2))), "mean": float(np.mean(errors)), "median": float(np.median(errors)),
+            "std": float(np.std(errors)), "min": float(np.min(errors)), "max": float(np.max(errors)), "count": len(errors)}
+
+
+def associate(t_est: np.ndarray, t_gt: np.ndarray, max_dt=0.02):
+    """
+    为每个估计位姿找时间最近的真值，时间差超过max_dt的丢弃，一个真值只匹配时间差最小的那个估计
+
+    Args:
+        t_est: (n,) 估计的时间戳
+        t_gt: (m,) 真值的时间戳，升序
+        max_dt: 最大时间差，与时间戳单位相同
+    Returns:
+        i_est, i_gt: 匹配上的下标，按i_est升序
+    """
+    t_est, t_gt = np.asarray(t_est), np.asarray(t_gt)
+    pos = np.searchsorted(t_gt, t_est)
+    left = np.clip(pos - 1, 0, len(t_gt) - 1)
+    right = np.clip(pos, 0, len(t_gt) - 1)
+    i_gt = np.where(np.abs(t_gt[right] - t_est) < np.abs(t_gt[left] - t_est), right, left)
+    dt = np.abs(t_gt[i_gt] - t_est)
+    i_est = np.flatnonzero(dt <= max_dt)
+    i_gt, dt = i_gt[i_est], dt[i_est]
+
+    # 同一个真值被多次匹配时只保留时间差最小的
+    order = np.lexsort((dt, i_gt))
+    first = np.r_[True, i_gt[order][1:] != i_gt[order][:-1]]
+    keep = np.sort(order[first])
+    return i_est[keep], i_gt[keep]
+
+
+def umeyama(src: np.ndarray, dst: np.ndarray, with_scale=False):
+    """
+    求解dst ≈ s * R @ src + t的最小二乘解
+
+    Args:
+        src, dst: (n, 3)
+        with_scale: True为Sim(3)，False为SE(3)（s=1）
+    Returns:
+        R: (3, 3), t: (3,), s: float
+    """
+    mu_src, mu_dst = src.mean(axis=0), dst.mean(axis=0)
+    src_c, dst_c = src - mu_src, dst - mu_dst
+    cov = dst_c.T @ src_c / len(src)
+    U, D, Vt = np.linalg.svd(cov)
+    S = np.eye(3)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        S[2, 2] = -1
+    R = U @ S @ Vt
+    s = float(np.trace(np.diag(D) @ S) / np.mean(np.sum(src_c ** 2, axis=1))) if with_scale else 1.0
+    t = mu_dst - s * R @ mu_src
+    return R, t, s
+
+
+def align(pose_est: np.ndarray, pose_gt: np.ndarray, mode="se3", n_align=None, out=None):
+    """
+    用位置对齐估计轨迹到真值坐标系
+
+    Args:
+        pose_est, pose_gt: (n, 4, 4) 已经一一对应的位姿
+        mode: se3, sim3或者none
+        n_align: 只用前n_align个位姿求解对齐，默认使用全部
+        out: (n, 4, 4) 输出，可以是pose_est本身（原地对齐）
+    Returns:
+        aligned: (n, 4, 4) 对齐后的估计位姿
+        transform: (R, t, s)
+    """
+    if mode == "none":
+        if out is None:
+            return np.asarray(pose_est, dtype=np.float64), (np.eye(3), np.zeros(3), 1.0)
+        out[:] = pose_est
+        return out, (np.eye(3), np.zeros(3), 1.0)
+    if mode not in ("se3", "sim3"):
+        raise ValueError("mode must be se3, sim3 or none")
+    n = len(pose_est) if n_align is None else n_align
+    R, t, s = umeyama(pose_est[:n, :3, 3], pose_gt[:n, :3, 3], with_scale=mode == "sim3")
+    aligned = np.empty(np.shape(pose_est), dtype=np.float64) if out is None else out
+    # 先算平移，out为pose_est时旋转部分会被覆盖
+    position = s * pose_est[:, :3, 3] @ R.T + t
+    np.matmul(R, pose_est[:, :3, :3], out=aligned[:, :3, :3])
+    aligned[:, :3, 3] = position
+    aligned[:, 3, :3] = 0
+    aligned[:, 3, 3] = 1
+    return aligned, (R, t, s)
+
+
+def _angle_from_trace(trace):
+    """
+    Returns:
+        迹为trace的旋转矩阵的旋转角（度）
+    """
+    return np.degrees(np.arccos(np.clip((trace - 1) / 2, -1, 1)))
+
+
+def ate(pose_est: np.ndarray, pose_gt: np.ndarray):
+    """
+    绝对轨迹误差，pose_est需要已经对齐
+
+    Returns:
+        dict: trans: (n,) 位置误差, rot: (n,) 旋转误差（度），以及两者的统计量
+    """
+    trans = np.linalg.norm(pose_est[:, :3, 3] - pose_gt[:, :3, 3], axis=-1)
+    # tr(G^T P)为两个旋转矩阵逐元素乘积之和，不需要矩阵乘法
+    rot = _angle_from_trace(np.einsum('nij,nij->n', pose_gt[:, :3, :3], pose_est[:, :3, :3]))
+    return {"trans": trans, "rot": rot, "trans_stats": statistics(trans), "rot_stats": statistics(rot)}
+
+
+def rpe(pose_est: np.ndarray, pose_gt: np.ndarray, deltas=(1,), unit="frames"):
+    """
+    相对位姿误差，对所有位姿对(i, j)批量计算E_ij = inv(inv(G_i) @ G_j) @ (inv(P_i) @ P_j)
+
+    Args:
+        deltas: 间隔列表
+        unit: frames: j = i + delta；meters: j为真值轨迹上累计行驶距离达到delta米的第一个位姿
+    Returns:
+        list，每个delta一项：delta, index: (k,) 每个位姿对的起点i, trans: (k,), rot: (k,)（度），trans_stats, rot_stats。
+        pose_gt[index, :3, 3]与trans/rot一起可以用plot_xyz等画出误差沿轨迹的分布
+    """
+    if unit not in ("frames", "meters"):
+        raise ValueError("unit must be frames or meters")
+    R_est, p_est = pose_est[:, :3, :3], pose_est[:, :3, 3]
+    R_gt, p_gt = pose_gt[:, :3, :3], pose_gt[:, :3, 3]
+    # 误差旋转的迹 tr((G_i^T G_j)^T (P_i^T P_j)) = tr(M_j^T M_i)，其中M = G P^T，每个位姿只算一次
+    M = R_gt @ np.swapaxes(R_est, 1, 2)
+    if unit == "meters":
+        distance = np.r_[0, np.cumsum(np.linalg.norm(np.diff(p_gt, axis=0), axis=-1))]
+
+    results = []
+    for delta in deltas:
+        if unit == "frames":
+            # 位姿对是连续的区间，用切片代替下标数组，避免复制
+            m = max(len(pose_est) - int(delta), 0)
+            index = np.arange(m)
+            i, j = slice(0, m), slice(int(delta), int(delta) + m)
+        else:
+            j = np.searchsorted(distance, distance + delta, side='left')
+            index = i = np.flatnonzero(j < len(distance))
+            j = j[i]
+        # 误差的平移为inv(rel_gt)的旋转作用在两个相对平移之差上，长度等于相对平移之差的长度
+        t_est = np.einsum('nji,nj->ni', R_est[i], p_est[j] - p_est[i])
+        t_gt = np.einsum('nji,nj->ni', R_gt[i], p_gt[j] - p_gt[i])
+        trans = np.linalg.norm(t_est - t_gt, axis=-1)
+        rot = _angle_from_trace(np.einsum('nij,nij->n', M[i], M[j]))
+        results.append({"delta": delta, "index": index, "trans": trans, "rot": rot,
+                        "trans_stats": statistics(trans), "rot_stats": statistics(rot)})
+    return results
+
+
+def evaluate_tum(traj_est: np.ndarray, traj_gt: np.ndarray, max_dt=0.02, mode="se3", deltas=(1,), unit="frames"):
+    """
+    评估两条TUM格式的轨迹
+
+    Args:
+        traj_est, traj_gt: (n, 8), (m, 8)，真值按时间升序
+        max_dt: 时间戳关联的最大时间差（秒）
+        mode: 对齐方式，se3, sim3或者none
+        deltas, unit: 见rpe
+    Returns:
+        dict: timestamp, pose_est（对齐后）, pose_gt, transform, ate, rpe。对齐后的位姿可以直接给plot_pose
+    """
+    i_est, i_gt = associate(traj_est[:, 0], traj_gt[:, 0], max_dt)
+    timestamp, pose_est = tum_to_pose(np.asarray(traj_est)[i_est])
+    _, pose_gt = tum_to_pose(np.asarray(traj_gt)[i_gt])
+    pose_est, transform = align(pose_est, pose_gt, mode, out=pose_est)
+    return {"timestamp": timestamp, "pose_est": pose_est, "pose_gt": pose_gt, "transform": transform,
+            "ate": ate(pose_est, pose_gt), "rpe": rpe(pose_est, pose_gt, deltas, unit)}
+
+
+if __name__ == '__main__':
+    import time
+    from utils.traj_io import pose_to_tum
+
+    num_poses = 1000000
+    timestamp = np.arange(num_poses) * 0.01
+    yaw = np.cumsum(np.random.normal(0, 1e-3, num_poses))
+    pose_gt = np.tile(np.eye(4), (num_poses, 1, 1))
+    pose_gt[:, 0, 0], pose_gt[:, 0, 1], pose_gt[:, 1, 0], pose_gt[:, 1, 1] = np.cos(yaw), -np.sin(yaw), np.sin(yaw), np.cos(yaw)
+    pose_gt[:, 0, 3], pose_gt[:, 1, 3] = np.cumsum(0.1 * np.cos(yaw)), np.cumsum(0.1 * np.sin(yaw))
+    pose_est = pose_gt.copy()
+    pose_est[:, :3, 3] += np.random.normal(0, 0.05, (num_poses, 3))
+
+    traj_est, traj_gt = pose_to_tum(timestamp + 0.001, pose_est), pose_to_tum(timestamp, pose_gt)
+    start = time.perf_counter()
+    result = evaluate_tum(traj_est, traj_gt, deltas=(1, 10, 100))
+    print(f"evaluate {num_poses} poses in {time.perf_counter() - start:.2f}s")
+    print("ATE", result["ate"]["trans_stats"])
+    for item in result["rpe"]:
+        print("RPE", item["delta"], item["trans_stats"])
@@ -0,0 +1,145 @@
+# -*- coding: UTF-8 -*-
+import os
+import time
+import json
+import errno
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Project ：SLAMBox
+# File    ：file_export.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+多线程、增量的文件导出：支持复制、硬链接、reflink和软链接，目标文件与源文件大小和修改时间一致时跳过
+"""
+
+EXPORT_MODES = ("copy", "hardlink", "reflink", "symlink")
+
+_FICLONE = 0x40049409  # linux ioctl FICLONE
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+        fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+    shutil.copystat(src, dst)
+
+
+def _up_to_date(src_stat, dst):
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def _export_one(src, dst, mode):
+    """
+    Returns:
+        (实际使用的方式, 字节数)，目标已是最新时方式为skip
+    """
+    src_stat = os.stat(src)
+    if _up_to_date(src_stat, dst):
+        return "skip", src_stat.st_size
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+    used = mode
+    try:
+        if mode == "hardlink":
+            os.link(src, dst)
+        elif mode == "symlink":
+            os.symlink(os.path.abspath(src), dst)
+        elif mode == "reflink":
+            _reflink(src, dst)
+        else:
+            shutil.copy2(src, dst)
+    except OSError as e:
+        # 跨设备或者文件系统不支持时退回到复制
+        if mode == "copy" or e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM):
+            raise
+        if os.path.lexists(dst):
+            os.remove(dst)
+        shutil.copy2(src, dst)
+        used = "copy"
+    return used, src_stat.st_size
+
+
+def export_files(pairs, mode="copy", workers=8, manifest_path=None, verbose=True):
+    """
+    使用有界线程池导出文件
+
+    Args:
+        pairs: 可迭代的(src, dst)
+        mode: copy, hardlink, reflink, symlink；hardlink和reflink失败时退回到copy
+        workers: 线程数，同时提交的任务数不超过workers * 4
+        manifest_path: 清单文件路径，记录每个目标文件的源文件、大小、修改时间和导出方式，已存在时合并
+        verbose: 是否打印吞吐量
+    Returns:
+        stats: dict，包含files, exported, skipped, failed, bytes, seconds, files_per_second, mb_per_second
+    """
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"mode must be one of {EXPORT_MODES}")
+
+    manifest = {}
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding='utf8') as fp:
+            manifest = json.load(fp)
+
+    stats = {"files": 0, "exported": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    errors = []
+    made_dirs = set()
+    start = time.perf_counter()
+
+    def collect(future, src, dst):
+        try:
+            used, size = future.result()
+        except OSError as e:
+            stats["failed"] += 1
+            errors.append((src, dst, str(e)))
+            return
+        if used == "skip":
+            stats["skipped"] += 1
+            used = manifest.get(dst, {}).get("mode", mode)
+        else:
+            stats["exported"] += 1
+            stats["bytes"] += size
+        src_stat = os.stat(src)
+        manifest[dst] = {"src": src, "size": src_stat.st_size, "mtime_ns": src_stat.st_mtime_ns, "mode": used}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        for src, dst in pairs:
+            stats["files"] += 1
+            dst_dir = os.path.dirname(dst)
+            if dst_dir not in made_dirs:
+                os.makedirs(dst_dir, exist_ok=True)
+                made_dirs.add(dst_dir)
+            running[executor.submit(_export_one, src, dst, mode)] = (src, dst)
+            if len(running) >= workers * 4:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, *running.pop(future))
+        for future in list(running):
+            collect(future, *running.pop(future))
+
+    seconds = time.perf_counter() - start
+    stats["seconds"] = seconds
+    stats["files_per_second"] = stats["files"] / seconds if seconds > 0 else 0.0
+    stats["mb_per_second"] = stats["bytes"] / 1e6 / seconds if seconds > 0 else 0.0
+    stats["errors"] = errors
+
+    if manifest_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding='utf8') as fp:
+            json.dump(manifest, fp, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+    if verbose:
+        print(f"export {stats['files']} files ({mode}): {stats['exported']} exported, {stats['skipped']} skipped, "
+              f"{stats['failed']} failed, {seconds:.2f}s, {stats['files_per_second']:.1f} files/s, {stats['mb_per_second']:.1f} MB/s")
+    return stats
@@ -0,0 +1,134 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+from utils import se3
+
+# Project ：SLAMBox
+# File    ：odometry.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+轮速计/阿克曼模型航迹推算
+"""
+
+
+def ackermann_velocity(steer, rear_left_speed, rear_right_speed, steer_ratio=16.6, wheel_base=2.588, wheel_radius=0.305):
+    """
+    由方向盘转角和后轮转速得到车体的前向速度和角速度
+
+    Args:
+        steer: (n,) 方向盘转角，单位为度，比如zoe_veh_info中的steer_corrected
+        rear_left_speed: (n,) 左后轮转速，单位为rpm
+        rear_right_speed: (n,) 右后轮转速，单位为rpm
+        steer_ratio: 转向比
+        wheel_base: 前后轮轴距
+        wheel_radius: 车轮半径
+    Returns:
+        vx: (n,) 前向速度 m/s
+        w: (n,) 角速度 rad/s
+    """
+    circumference = 2 * np.pi * wheel_radius
+    vx = (np.asarray(rear_left_speed) + np.asarray(rear_right_speed)) / 2 * (circumference / 60)
+    wheel_steer = np.asarray(steer) * np.pi / (180 * steer_ratio)
+    w = vx * np.tan(wheel_steer) / wheel_base
+    return vx, w
+
+
+def _segment_cumsum(x, seg_start, seg_id):
+    # 分段的exclusive前缀和，每段从0开始
+    csum = np.concatenate([np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)[:-1]], axis=0)
+    return csum - csum[seg_start][seg_id]
+
+
+def integrate_se2(time, v, w, seg_start=None):
+    """
+    假设每个采样间隔内速度和角速度不变，按圆弧精确积分得到平面轨迹，全部使用前缀和完成
+
+    Args:
+        time: (n,) 时间 s
+        v: (n,) 前向速度
+        w: (n,) 角速度
+        seg_start: 多段数据拼接在一起时每段的起始下标，每段单独从原点开始积分
+    Returns:
+        x, y, yaw: (n,)
+    """
+    time, v, w = np.asarray(time, dtype=np.float64), np.asarray(v, dtype=np.float64), np.asarray(w, dtype=np.float64)
+    n = len(time)
+    seg_start = np.zeros(1, dtype=np.int64) if seg_start is None else np.asarray(seg_start)
+    seg_id = np.repeat(np.arange(len(seg_start)), np.diff(np.append(seg_start, n)))
+
+    dt = np.zeros(n)
+    dt[:-1] = np.diff(time)
+    dt[seg_start[1:] - 1] = 0  # 段与段之间不积分
+
+    dyaw = w * dt
+    yaw = _segment_cumsum(dyaw, seg_start, seg_id)
+
+    # 圆弧积分: ds * [cos(yaw + dyaw/2), sin(yaw + dyaw/2)] * sinc(dyaw/2)
+    ds = v * dt * np.sinc(dyaw / (2 * np.pi))
+    mid = yaw + dyaw / 2
+    x = _segment_cumsum(ds * np.cos(mid), seg_start, seg_id)
+    y = _segment_cumsum(ds * np.sin(mid), seg_start, seg_id)
+    return x, y, yaw
+
+
+def se2_to_pose(x, y, yaw):
+    """
+    Returns:
+        pose: (n, 4, 4)
+    """
+    c, s = np.cos(yaw), np.sin(yaw)
+    zero, one = np.zeros_like(c), np.ones_like(c)
+    R = np.stack([c, -s, zero, s, c, zero, zero, zero, one], axis=-1).reshape(-1, 3, 3)
+    return se3.from_rt(R, np.stack([x, y, zero], axis=-1))
+
+
+def se2_to_tum(time, x, y, yaw):
+    """
+    Returns:
+        tum: (n, 8)，timestamp tx ty tz qx qy qz qw
+    """
+    tum = np.zeros((len(x), 8))
+    tum[:, 0], tum[:, 1], tum[:, 2] = time, x, y
+    tum[:, 6], tum[:, 7] = np.sin(yaw / 2), np.cos(yaw / 2)
+    return tum
+
+
+def ackermann_odometry(time, steer, rear_left_speed, rear_right_speed, steer_ratio=16.6, wheel_base=2.588, wheel_radius=0.305,
+                       output="pose"):
+    """
+    阿克曼模型航迹推算，输入可以是一个场景的数组，也可以是多个场景的数组列表，多个场景拼接后一次完成积分
+
+    Args:
+        time: (n,) 时间 s，或者多个场景的列表
+        steer: (n,) 方向盘转角（度），或者多个场景的列表
+        rear_left_speed: (n,) 左后轮转速（rpm），或者多个场景的列表
+        rear_right_speed: (n,) 右后轮转速（rpm），或者多个场景的列表
+        output: pose: 输出(n, 4, 4)；tum: 输出(n, 8)，可以直接给plot_tum使用
+    Returns:
+        单个场景时为一个数组，多个场景时为数组列表
+    """
+    batch = isinstance(time, (list, tuple))
+    if batch:
+        lengths = [len(t) for t in time]
+        seg_start = np.cumsum([0] + lengths[:-1])
+        time, steer = np.concatenate(time), np.concatenate(steer)
+        rear_left_speed, rear_right_speed = np.concatenate(rear_left_speed), np.concatenate(rear_right_speed)
+    else:
+        seg_start = None
+
+    v, w = ackermann_velocity(steer, rear_left_speed, rear_right_speed, steer_ratio, wheel_base, wheel_radius)
+    x, y, yaw = integrate_se2(time, v, w, seg_start)
+
+    if output == "pose":
+        result = se2_to_pose(x, y, yaw)
+    elif output == "tum":
+        result = se2_to_tum(time, x, y, yaw)
+    else:
+        raise ValueError("output must be pose or tum")
+
+    if batch:
+        return np.split(result, seg_start[1:])
+    return result
@@ -0,0 +1,205 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+from utils import se3
+from utils.time_sync import interp_sorted
+
+# Project ：SLAMBox
+# File    ：preintegration.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+关键帧之间的IMU预积分（Forster et al., On-Manifold Preintegration）。IMU时间与关键帧时间合并成一个网格，
+每一小步属于哪个关键帧区间由有序查找得到；旋转的连乘用分段的并行前缀积，速度、位置和偏置雅可比用分段前缀和，
+协方差按步同步递推，每一步同时更新所有区间
+"""
+
+
+def _segment_start(seg):
+    """
+    Returns:
+        (n,) 每一步所在区间的第一步的下标
+    """
+    first = np.r_[True, seg[1:] != seg[:-1]]
+    return np.maximum.accumulate(np.where(first, np.arange(len(seg)), 0))
+
+
+def _segment_cumsum(x, start):
+    """
+    分段的包含前缀和，每个区间从0开始累加
+    """
+    cs = np.cumsum(x, axis=0)
+    return cs - (cs[start] - x[start])
+
+
+def _segment_cumprod(M, start):
+    """
+    分段的包含前缀积M[s] @ ... @ M[i]，Hillis-Steele并行前缀，共log2(n)轮批量矩阵乘法
+    """
+    out = M.copy()
+    index = np.arange(len(M))
+    d = 1
+    while d < len(M):
+        i = index[d:][index[d:] - d >= start[d:]]
+        if len(i) == 0:
+            break
+        out[i] = out[i - d] @ out[i]
+        d *= 2
+    return out
+
+
+def preintegrate(imu_time, gyro, accel, key_time, bias_gyro=None, bias_accel=None, gyro_noise=1.7e-4, accel_noise=2e-3):
+    """
+    计算相邻关键帧之间的预积分量
+
+    Args:
+        imu_time: (n,) IMU时间戳（秒），递增
+        gyro: (n, 3) 角速度（rad/s）
+        accel: (n, 3) 加速度（m/s²）
+        key_time: (m,) 关键帧时间戳（秒），严格递增，比如相机关键帧的时间
+        bias_gyro, bias_accel: (3,) 预积分时使用的偏置，默认为0
+        gyro_noise: 陀螺仪白噪声密度（rad/s/√Hz）
+        accel_noise: 加速度计白噪声密度（m/s²/√Hz）
+    Returns:
+        dict，每一项的第一维为m-1个区间：
+            dt: 区间时长
+            dR: (3, 3), dv: (3,), dp: (3,) 预积分的旋转、速度和位置增量
+            cov: (9, 9) [δφ, δv, δp]的协方差
+            dR_dbg, dv_dbg, dv_dba, dp_dbg, dp_dba: (3, 3) 对偏置的雅可比
+    """
+    imu_time, key_time = np.asarray(imu_time, dtype=np.float64), np.asarray(key_time, dtype=np.float64)
+    if np.any(np.diff(key_time) <= 0):
+        raise ValueError("key_time must be strictly increasing")
+    bias_gyro = np.zeros(3) if bias_gyro is None else np.asarray(bias_gyro)
+    bias_accel = np.zeros(3) if bias_accel is None else np.asarray(bias_accel)
+
+    # 合并IMU时间和关键帧时间，关键帧处的测量线性插值，每一步使用两端测量的平均值
+    inner = imu_time[np.searchsorted(imu_time, key_time[0], side='right'):np.searchsorted(imu_time, key_time[-1], side='left')]
+    grid = np.unique(np.concatenate([key_time, inner]))
+    w_grid = interp_sorted(grid, imu_time, gyro)
+    a_grid = interp_sorted(grid, imu_time, accel)
+    dt = np.diff(grid)
+    w = 0.5 * (w_grid[1:] + w_grid[:-1]) - bias_gyro
+    a = 0.5 * (a_grid[1:] + a_grid[:-1]) - bias_accel
+    seg = np.searchsorted(key_time, grid[:-1], side='right') - 1
+    start = _segment_start(seg)
+    last = np.r_[np.flatnonzero(seg[1:] != seg[:-1]), len(seg) - 1]
+    first = start == np.arange(len(seg))
+    dt_ = dt[:, None]
+    dt__ = dt[:, None, None]
+
+    # 旋转：dR_incl[i]为区间起点到第i步结束，dR_before[i]为到第i步开始
+    dR_step = se3.so3_exp(w * dt_)
+    dR_incl = _segment_cumprod(dR_step, start)
+    dR_before = np.where(first[:, None, None], np.eye(3), np.roll(dR_incl, 1, axis=0))
+
+    # 速度和位置
+    a_world = np.einsum('nij,nj->ni', dR_before, a)
+    dv_incl = _segment_cumsum(a_world * dt_, start)
+    dv_before = dv_incl - a_world * dt_
+    dp_incl = _segment_cumsum(dv_before * dt_ + 0.5 * a_world * dt_ ** 2, start)
+
+    # 偏置雅可比：dR/dbg在第k步开始时为 -dR_before[k]^T * Σ_{l<k} dR_incl[l] Jr[l] dt[l]
+    Jr = se3.so3_right_jacobian(w * dt_)
+    term = dR_incl @ Jr * dt__
+    S_incl = _segment_cumsum(term, start)
+    JR_before = -np.swapaxes(dR_before, 1, 2) @ (S_incl - term)
+    Ra = dR_before @ se3.hat(a)  # R [a]×
+
+    term = -dR_before * dt__
+    dv_dba_incl = _segment_cumsum(term, start)
+    dv_dba_before = dv_dba_incl - term
+    term = -Ra @ JR_before * dt__
+    dv_dbg_incl = _segment_cumsum(term, start)
+    dv_dbg_before = dv_dbg_incl - term
+    dp_dba_incl = _segment_cumsum(dv_dba_before * dt__ - 0.5 * dR_before * dt__ ** 2, start)
+    dp_dbg_incl = _segment_cumsum(dv_dbg_before * dt__ - 0.5 * Ra @ JR_before * dt__ ** 2, start)
+
+    dR_total = dR_incl[last]
+    result = {
+        "dt": np.diff(key_time),
+        "dR": dR_total, "dv": dv_incl[last], "dp": dp_incl[last],
+        "dR_dbg": -np.swapaxes(dR_total, 1, 2) @ S_incl[last],
+        "dv_dbg": dv_dbg_incl[last], "dv_dba": dv_dba_incl[last],
+        "dp_dbg": dp_dbg_incl[last], "dp_dba": dp_dba_incl[last],
+    }
+    result["cov"] = _covariance(dR_step, dR_before, Ra, Jr, dt, seg, start, len(key_time) - 1, gyro_noise, accel_noise)
+    return result
+
+
+def _covariance(dR_step, dR_before, Ra, Jr, dt, seg, start, num_intervals, gyro_noise, accel_noise):
+    """
+    Σ_{k+1} = A_k Σ_k A_k^T + B_k Q_k B_k^T，所有步的A和BQB^T先批量算好，再按区间内的步号同步递推
+    """
+    n = len(dt)
+    I = np.eye(3)
+    dt__ = dt[:, None, None]
+    A = np.zeros((n, 9, 9))
+    A[:, 0:3, 0:3] = np.swapaxes(dR_step, 1, 2)
+    A[:, 3:6, 0:3] = -Ra * dt__
+    A[:, 3:6, 3:6] = I
+    A[:, 6:9, 0:3] = -0.5 * Ra * dt__ ** 2
+    A[:, 6:9, 3:6] = I * dt__
+    A[:, 6:9, 6:9] = I
+    # 离散噪声协方差为σ²/dt
+    noise_g = Jr * dt__ * (gyro_noise / np.sqrt(dt))[:, None, None]
+    noise_a = np.zeros((n, 9, 3))
+    noise_a[:, 3:6] = dR_before * dt__
+    noise_a[:, 6:9] = 0.5 * dR_before * dt__ ** 2
+    noise_a *= (accel_noise / np.sqrt(dt))[:, None, None]
+    BQB = np.zeros((n, 9, 9))
+    BQB[:, 0:3, 0:3] = noise_g @ np.swapaxes(noise_g, 1, 2)
+    BQB += noise_a @ np.swapaxes(noise_a, 1, 2)
+
+    # 第s轮更新所有长度大于s的区间的第s步
+    step = np.arange(n) - start
+    order = np.lexsort((seg, step))
+    bounds = np.searchsorted(step[order], np.arange(step.max() + 2))
+    cov = np.zeros((num_intervals, 9, 9))
+    for s in range(len(bounds) - 1):
+        rows = order[bounds[s]:bounds[s + 1]]
+        k = seg[rows]
+        cov[k] = A[rows] @ cov[k] @ np.swapaxes(A[rows], 1, 2) + BQB[rows]
+    return cov
+
+
+def correct(result, delta_bias_gyro, delta_bias_accel):
+    """
+    偏置变化较小时不重新积分，用雅可比一阶修正预积分量
+
+    Args:
+        result: preintegrate的返回值
+        delta_bias_gyro, delta_bias_accel: (3,) 或 (m-1, 3) 新偏置减去预积分时使用的偏置
+    Returns:
+        dR, dv, dp
+    """
+    dbg = np.broadcast_to(delta_bias_gyro, result["dv"].shape)
+    dba = np.broadcast_to(delta_bias_accel, result["dv"].shape)
+    mul = lambda J, x: np.einsum('nij,nj->ni', J, x)
+    dR = result["dR"] @ se3.so3_exp(mul(result["dR_dbg"], dbg))
+    dv = result["dv"] + mul(result["dv_dbg"], dbg) + mul(result["dv_dba"], dba)
+    dp = result["dp"] + mul(result["dp_dbg"], dbg) + mul(result["dp_dba"], dba)
+    return dR, dv, dp
+
+
+if __name__ == '__main__':
+    import time
+
+    from dataset_tutorial.nuscenes.can_cache import CanBusCache
+    from dataset_tutorial.nuscenes.timeline import load_timeline
+
+    dataset_root = "./v1.0-mini"  # 数据集路径
+
+    timeline = load_timeline(dataset_root, 'v1.0-mini')
+    can_cache = CanBusCache(dataroot=dataset_root)
+    scene_name = timeline.scene_names[0]
+    imu = can_cache.get_columns(scene_name, 'ms_imu', ['utime', 'rotation_rate', 'linear_accel'])
+    # 以CAM_FRONT关键帧的时间作为预积分区间
+    key_time = timeline.timestamp[timeline.frames(scene_name, "CAM_FRONT", key_only=True)] / 1e6
+
+    start = time.perf_counter()
+    result = preintegrate(imu['utime'] / 1e6, imu['rotation_rate'], imu['linear_accel'], key_time)
+    print(f"{len(imu['utime'])} imu samples, {len(key_time) - 1} intervals in {(time.perf_counter() - start) * 1000:.1f}ms")
+    print("dv of the first interval:", result["dv"][0])
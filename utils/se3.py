@@ -0,0 +1,381 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：se3.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+批量的SO(3)/SE(3)运算。位姿为(n, 4, 4)，向量形式为(n, 7)的tx ty tz qx qy qz qw（与TUM去掉时间戳后相同），
+四元数默认(w, x, y, z)。输出与输入的浮点类型一致（float32或float64），out参数可以传入预先分配的数组，out不能与输入重叠
+"""
+
+
+def _dtype(*arrays):
+    return np.result_type(*arrays, np.float32)
+
+
+def _empty(out, shape, dtype):
+    return np.empty(shape, dtype=dtype) if out is None else out
+
+
+def from_rt(R: np.ndarray, t: np.ndarray, out=None):
+    """
+    Args:
+        R: (n, 3, 3)
+        t: (n, 3)
+    Returns:
+        T: (n, 4, 4)
+    """
+    R, t = np.asarray(R), np.asarray(t)
+    T = _empty(out, R.shape[:-2] + (4, 4), _dtype(R, t))
+    T[..., :3, :3] = R
+    T[..., :3, 3] = t
+    T[..., 3, :3] = 0
+    T[..., 3, 3] = 1
+    return T
+
+
+def inverse(T: np.ndarray, out=None):
+    """
+    刚体变换的闭式求逆：[R^T, -R^T t]
+    """
+    T = np.asarray(T)
+    out = _empty(out, T.shape, _dtype(T))
+    R_T = np.swapaxes(T[..., :3, :3], -1, -2)
+    out[..., :3, :3] = R_T
+    np.matmul(R_T, T[..., :3, 3:], out=out[..., :3, 3:])
+    np.negative(out[..., :3, 3:], out=out[..., :3, 3:])
+    out[..., 3, :3] = 0
+    out[..., 3, 3] = 1
+    return out
+
+
+def compose(A: np.ndarray, B: np.ndarray, out=None):
+    """
+    A @ B，A和B的批维度可以广播，比如(1, 4, 4)和(n, 4, 4)。两个刚体变换相乘时最后一行保持为精确的[0, 0, 0, 1]
+    """
+    A, B = np.asarray(A), np.asarray(B)
+    return np.matmul(A, B, out=out)
+
+
+def relative(A: np.ndarray, B: np.ndarray, out=None):
+    """
+    inv(A) @ B，A使用闭式求逆，比如relative(pose[:1], pose)将轨迹对齐到第一帧
+    """
+    return np.matmul(inverse(A), np.asarray(B), out=out)
+
+
+def transform_points(T: np.ndarray, points: np.ndarray):
+    """
+    R @ p + t
+
+    Args:
+        T: (n, 4, 4)或(4, 4)
+        points: (n, 3)
+    """
+    T = np.asarray(T)
+    return np.einsum('...ij,...j->...i', T[..., :3, :3], points) + T[..., :3, 3]
+
+
+def quaternion_to_matrix(q: np.ndarray, order="wxyz", out=None):
+    """
+    Args:
+        q: (n, 4)，不要求单位化
+        order: wxyz或者xyzw
+    Returns:
+        R: (n, 3, 3)
+    """
+    q = np.asarray(q)
+    if order == "wxyz":
+        w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    elif order == "xyzw":
+        x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    else:
+        raise ValueError("order must be wxyz or xyzw")
+    s = 2 / (w * w + x * x + y * y + z * z)
+    R = _empty(out, q.shape[:-1] + (3, 3), _dtype(q))
+    xx, yy, zz = x * x * s, y * y * s, z * z * s
+    xy, xz, yz = x * y * s, x * z * s, y * z * s
+    wx, wy, wz = w * x * s, w * y * s, w * z * s
+    R[..., 0, 0], R[..., 0, 1], R[..., 0, 2] = 1 - yy - zz, xy - wz, xz + wy
+    R[..., 1, 0], R[..., 1, 1], R[..., 1, 2] = xy + wz, 1 - xx - zz, yz - wx
+    R[..., 2, 0], R[..., 2, 1], R[..., 2, 2] = xz - wy, yz + wx, 1 - xx - yy
+    return R
+
+
+def matrix_to_quaternion(R: np.ndarray, order="wxyz", out=None):
+    """
+    Shepperd方法，选取最大的分量计算，避免除以接近0的数。out只省去结果数组，选取分量时的中间数组仍然会分配
+
+    Returns:
+        q: (n, 4)，w >= 0
+    """
+    R = np.asarray(R)
+    m00, m01, m02 = R[..., 0, 0], R[..., 0, 1], R[..., 0, 2]
+    m10, m11, m12 = R[..., 1, 0], R[..., 1, 1], R[..., 1, 2]
+    m20, m21, m22 = R[..., 2, 0], R[..., 2, 1], R[..., 2, 2]
+    # 四个分量平方的四倍
+    sq = np.stack([1 + m00 + m11 + m22, 1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22], axis=-1)
+    k = np.argmax(sq, axis=-1)[..., None]
+    s = np.sqrt(np.maximum(np.take_along_axis(sq, k, axis=-1)[..., 0], 1e-30)) * 2  # 4 * 最大分量
+    candidates = np.stack([
+        np.stack([s / 4, (m21 - m12) / s, (m02 - m20) / s, (m10 - m01) / s], axis=-1),
+        np.stack([(m21 - m12) / s, s / 4, (m01 + m10) / s, (m02 + m20) / s], axis=-1),
+        np.stack([(m02 - m20) / s, (m01 + m10) / s, s / 4, (m12 + m21) / s], axis=-1),
+        np.stack([(m10 - m01) / s, (m02 + m20) / s, (m12 + m21) / s, s / 4], axis=-1),
+    ], axis=-2)
+    q = np.take_along_axis(candidates, k[..., None], axis=-2)[..., 0, :]
+    q *= np.where(q[..., :1] < 0, -1, 1).astype(q.dtype)
+    if out is None:
+        return q if order == "wxyz" else q[..., [1, 2, 3, 0]]
+    if order == "wxyz":
+        out[...] = q
+    else:
+        out[..., :3], out[..., 3] = q[..., 1:], q[..., 0]
+    return out
+
+
+def from_vector(v: np.ndarray, out=None):
+    """
+    Args:
+        v: (n, 7) tx ty tz qx qy qz qw
+    Returns:
+        T: (n, 4, 4)
+    """
+    v = np.asarray(v)
+    out = _empty(out, v.shape[:-1] + (4, 4), _dtype(v))
+    quaternion_to_matrix(v[..., 3:7], order="xyzw", out=out[..., :3, :3])
+    return from_rt(out[..., :3, :3], v[..., :3], out=out)
+
+
+def to_vector(T: np.ndarray, out=None):
+    """
+    Returns:
+        v: (n, 7) tx ty tz qx qy qz qw
+    """
+    T = np.asarray(T)
+    out = _empty(out, T.shape[:-2] + (7,), _dtype(T))
+    out[..., :3] = T[..., :3, 3]
+    matrix_to_quaternion(T[..., :3, :3], order="xyzw", out=out[..., 3:])
+    return out
+
+
+def hat(phi: np.ndarray, out=None):
+    """
+    (n, 3) -> (n, 3, 3)反对称矩阵
+    """
+    phi = np.asarray(phi)
+    K = _empty(out, phi.shape[:-1] + (3, 3), _dtype(phi))
+    K[..., 0, 0] = K[..., 1, 1] = K[..., 2, 2] = 0
+    K[..., 0, 1], K[..., 0, 2] = -phi[..., 2], phi[..., 1]
+    K[..., 1, 0], K[..., 1, 2] = phi[..., 2], -phi[..., 0]
+    K[..., 2, 0], K[..., 2, 1] = -phi[..., 1], phi[..., 0]
+    return K
+
+
+def _coefficients(theta):
+    """
+    sin(θ)/θ, (1-cos(θ))/θ², (θ-sin(θ))/θ³，θ较小时使用泰勒展开
+    """
+    small = theta < 1e-4
+    t = np.where(small, 1, theta)
+    t2 = theta * theta
+    A = np.where(small, 1 - t2 / 6, np.sin(t) / t)
+    B = np.where(small, 0.5 - t2 / 24, (1 - np.cos(t)) / (t * t))
+    C = np.where(small, 1 / 6 - t2 / 120, (t - np.sin(t)) / (t * t * t))
+    return A, B, C
+
+
+def _rodrigues(K, a, b, out):
+    """
+    out = I + a K + b K²
+    """
+    np.matmul(K, K, out=out)
+    out *= b[..., None, None]
+    out += a[..., None, None] * K
+    out[..., 0, 0] += 1
+    out[..., 1, 1] += 1
+    out[..., 2, 2] += 1
+    return out
+
+
+def so3_exp(phi: np.ndarray, out=None):
+    """
+    Rodrigues公式，phi: (n, 3)旋转向量
+    """
+    phi = np.asarray(phi)
+    theta = np.linalg.norm(phi, axis=-1)
+    A, B, _ = _coefficients(theta)
+    K = hat(phi)
+    return _rodrigues(K, A, B, _empty(out, K.shape, K.dtype))
+
+
+def so3_right_jacobian(phi: np.ndarray):
+    """
+    SO(3)的右雅可比Jr(φ) = I - (1-cos(θ))/θ² [φ]× + (θ-sin(θ))/θ³ [φ]×²，用于IMU预积分的偏置雅可比和协方差
+    """
+    phi = np.asarray(phi)
+    theta = np.linalg.norm(phi, axis=-1)
+    _, B, C = _coefficients(theta)
+    K = hat(phi)
+    return np.eye(3, dtype=K.dtype) - B[..., None, None] * K + C[..., None, None] * (K @ K)
+
+
+def so3_log(R: np.ndarray, out=None):
+    """
+    经四元数计算，在θ接近0和π时都数值稳定
+
+    Returns:
+        phi: (n, 3)
+    """
+    q = matrix_to_quaternion(R)
+    v = q[..., 1:]
+    norm = np.linalg.norm(v, axis=-1)
+    small = norm < 1e-8
+    # θ = 2 * atan2(|v|, w)，φ = θ * v / |v|
+    scale = np.where(small, 2 / np.where(small, q[..., 0], 1), 2 * np.arctan2(norm, q[..., 0]) / np.where(small, 1, norm))
+    return np.multiply(v, scale[..., None], out=out)
+
+
+def se3_exp(xi: np.ndarray, out=None):
+    """
+    Args:
+        xi: (n, 6) [rho, phi]，平移在前
+    Returns:
+        T: (n, 4, 4)
+    """
+    xi = np.asarray(xi)
+    rho, phi = xi[..., :3], xi[..., 3:]
+    theta = np.linalg.norm(phi, axis=-1)
+    A, B, C = _coefficients(theta)
+    K = hat(phi)
+    T = _empty(out, xi.shape[:-1] + (4, 4), K.dtype)
+    V = _rodrigues(K, B, C, np.empty_like(K))
+    np.einsum('...ij,...j->...i', V, rho, out=T[..., :3, 3])
+    _rodrigues(K, A, B, T[..., :3, :3])
+    T[..., 3, :3] = 0
+    T[..., 3, 3] = 1
+    return T
+
+
+def se3_log(T: np.ndarray, out=None):
+    """
+    Returns:
+        xi: (n, 6) [rho, phi]
+    """
+    T = np.asarray(T)
+    out = _empty(out, T.shape[:-2] + (6,), _dtype(T))
+    phi = so3_log(T[..., :3, :3], out=out[..., 3:])
+    theta = np.linalg.norm(phi, axis=-1)
+    A, B, _ = _coefficients(theta)
+    small = theta < 1e-4
+    t2 = np.where(small, 1, theta * theta)
+    D = np.where(small, 1 / 12 + theta * theta / 720, (1 - A / (2 * np.where(small, 1, B))) / t2)
+    K = hat(phi)
+    V_inv = _rodrigues(K, np.full_like(D, -0.5), D, np.empty_like(K))
+    np.einsum('...ij,...j->...i', V_inv, T[..., :3, 3], out=out[..., :3])
+    return out
+
+
+def rotation_angle(R: np.ndarray):
+    """
+    Returns:
+        旋转角（弧度）
+    """
+    R = np.asarray(R)
+    return np.arccos(np.clip((np.trace(R, axis1=-2, axis2=-1) - 1) / 2, -1, 1))
+
+
+if __name__ == '__main__':
+    import time
+
+    def timeit(func, repeat=5):
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    num_poses = 1000000
+    q = np.random.normal(size=(num_poses, 4))
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    vector = np.concatenate([np.random.normal(size=(num_poses, 3)), np.roll(q, -1, axis=-1)], axis=-1)
+    pose = from_vector(vector)
+    buffer = np.empty_like(pose)
+    vector_buffer = np.empty_like(vector)
+
+    aligned = np.empty_like(pose)
+
+    # 替换前的写法：pyrotation构造位姿和四元数，np.linalg.inv求逆
+    baseline = {
+        "inverse": ("np.linalg.inv", lambda: np.linalg.inv(pose)),
+        "relative": ("np.linalg.inv", lambda: np.linalg.inv(pose) @ pose[::-1]),
+    }
+    try:
+        from pyrotation.conversion import matrix_from_quaternion, quaternion_from_matrix, fill_matrix
+
+        def pyrotation_from_vector():
+            return fill_matrix(matrix_from_quaternion(np.roll(vector[:, 3:], 1, axis=-1)), vector[:, :3])
+
+        def pyrotation_to_vector():
+            return np.concatenate([pose[:, :3, 3], np.roll(quaternion_from_matrix(pose[:, :3, :3]), -1, axis=-1)], axis=-1)
+
+        def pyrotation_align_first():
+            T = pyrotation_from_vector()
+            return np.linalg.inv(T[:1]) @ T
+
+        baseline.update({"from_vector": ("pyrotation", pyrotation_from_vector), "to_vector": ("pyrotation", pyrotation_to_vector),
+                         "align_first": ("pyrotation", pyrotation_align_first)})
+    except ImportError:
+        pass
+
+    ours = {
+        "from_vector": lambda: from_vector(vector, out=buffer),
+        "to_vector": lambda: to_vector(pose, out=vector_buffer),
+        # plot_tum中的整条链：TUM向量 -> 位姿 -> 对齐到第一帧
+        "align_first": lambda: relative(from_vector(vector, out=buffer)[:1], buffer, out=aligned),
+        "inverse": lambda: inverse(pose, out=buffer),
+        "relative": lambda: relative(pose, pose[::-1], out=buffer),
+        "compose": lambda: compose(pose, pose, out=buffer),
+    }
+    baseline["compose"] = ("@", lambda: pose @ pose)
+
+    print(f"{num_poses} poses")
+    for name, func in ours.items():
+        line = f"{name:16s} {timeit(func):.3f}s"
+        if name in baseline:
+            label, baseline_func = baseline[name]
+            line += f", {label} {timeit(baseline_func):.3f}s"
+        print(line)
+
+    # 仅作参考：逐个位姿调用pyquaternion，只跑一部分位姿，按位姿数折算到num_poses
+    try:
+        from pyquaternion import Quaternion
+
+        num_loop = 20000
+
+        def pyquaternion_from_vector():
+            for v in vector[:num_loop]:
+                T = Quaternion(v[6], v[3], v[4], v[5]).transformation_matrix
+                T[:3, 3] = v[:3]
+
+        def pyquaternion_to_vector():
+            for T in pose[:num_loop]:
+                q = Quaternion(matrix=T)
+                np.r_[T[:3, 3], q.x, q.y, q.z, q.w]
+
+        def pyquaternion_relative():
+            for a, b in zip(vector[:num_loop], vector[1:num_loop + 1]):
+                qa_inv = Quaternion(a[6], a[3], a[4], a[5]).inverse
+                qa_inv * Quaternion(b[6], b[3], b[4], b[5]), qa_inv.rotate(b[:3] - a[:3])
+
+        scale = num_poses / num_loop
+        print(f"pyquaternion     from_vector {timeit(pyquaternion_from_vector, 1) * scale:.3f}s, "
+              f"to_vector {timeit(pyquaternion_to_vector, 1) * scale:.3f}s, relative {timeit(pyquaternion_relative, 1) * scale:.3f}s "
+              f"(per-pose loop, extrapolated from {num_loop} poses)")
+    except ImportError:
+        pass
@@ -0,0 +1,144 @@
+# -*- coding: UTF-8 -*-
+import io
+import os
+import json
+import mmap
+import tarfile
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：shard_archive.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+顺序写入的tar分片归档，用于替代大量的小文件。每条记录在tar中保存为{key}{ext}和{key}.json两个成员，
+另外保存一个记录了每条数据在分片中偏移量的索引，读取时通过mmap直接切片，不需要解析tar
+"""
+
+INDEX_DTYPE = np.dtype([('shard', np.int32), ('offset', np.int64), ('size', np.int64),
+                        ('meta_offset', np.int64), ('meta_size', np.int64), ('timestamp', np.int64)])
+
+_BLOCK = tarfile.BLOCKSIZE
+
+
+class ShardWriter:
+    def __init__(self, root, prefix, shard_size=1 << 30):
+        """
+
+        Args:
+            root: 保存目录
+            prefix: 分片文件名前缀，分片为{prefix}-000000.tar，索引为{prefix}.index.npy和{prefix}.keys.json
+            shard_size: 单个分片的最大字节数，超过后开始写下一个分片
+        """
+        self.root = root
+        self.prefix = prefix
+        self.shard_size = shard_size
+        os.makedirs(root, exist_ok=True)
+        self._tar = None
+        self._shard = -1
+        self._index = []
+        self._keys = []
+
+    def _next_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+        self._shard += 1
+        self._tar = tarfile.open(os.path.join(self.root, f"{self.prefix}-{self._shard:06d}.tar"), "w", format=tarfile.GNU_FORMAT)
+
+    def _add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+        # addfile之后tar.offset位于补齐到512字节后的数据末尾
+        return self._tar.offset - (len(data) + _BLOCK - 1) // _BLOCK * _BLOCK
+
+    def write(self, key, data: bytes, meta: dict, timestamp=0, ext=".jpg"):
+        """
+        追加一条记录
+
+        Args:
+            key: 记录名，比如图片文件名（不含扩展名）
+            data: 编码后的数据，比如jpeg的字节
+            meta: 随记录保存的信息，比如时间戳和相机内外参
+            timestamp: 记录的时间戳
+            ext: 数据成员的扩展名
+        """
+        if self._tar is None or self._tar.offset >= self.shard_size:
+            self._next_shard()
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf8')
+        offset = self._add(key + ext, data)
+        meta_offset = self._add(key + ".json", meta_bytes)
+        self._index.append((self._shard, offset, len(data), meta_offset, len(meta_bytes), timestamp))
+        self._keys.append(key + ext)
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        np.save(os.path.join(self.root, f"{self.prefix}.index.npy"), np.array(self._index, dtype=INDEX_DTYPE))
+        with open(os.path.join(self.root, f"{self.prefix}.keys.json"), "w", encoding='utf8') as fp:
+            json.dump(self._keys, fp, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ShardReader:
+    def __init__(self, root, prefix):
+        """
+        按下标随机读取，返回的数据是分片mmap上的memoryview，不发生复制
+        """
+        self.root = root
+        self.prefix = prefix
+        self.index = np.load(os.path.join(root, f"{prefix}.index.npy"), mmap_mode='r')
+        with open(os.path.join(root, f"{prefix}.keys.json"), "r", encoding='utf8') as fp:
+            self.keys = json.load(fp)
+        self._maps = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+    def _map(self, shard):
+        if shard not in self._maps:
+            with open(os.path.join(self.root, f"{self.prefix}-{shard:06d}.tar"), "rb") as fp:
+                self._maps[shard] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i) -> memoryview:
+        record = self.index[i]
+        offset = int(record['offset'])
+        return memoryview(self._map(int(record['shard'])))[offset:offset + int(record['size'])]
+
+    def meta(self, i) -> dict:
+        record = self.index[i]
+        offset = int(record['meta_offset'])
+        return json.loads(self._map(int(record['shard']))[offset:offset + int(record['meta_size'])])
+
+    @property
+    def timestamps(self):
+        return self.index['timestamp']
+
+    def nearest(self, timestamp):
+        """
+        Returns:
+            时间戳最接近的记录下标（要求按时间顺序写入）
+        """
+        ts = self.timestamps
+        pos = np.clip(np.searchsorted(ts, timestamp), 1, max(len(ts) - 1, 1))
+        return int(pos - 1 if abs(ts[pos - 1] - timestamp) <= abs(ts[min(pos, len(ts) - 1)] - timestamp) else pos)
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps = {}
@@ -1,6 +1,7 @@
 # -*- coding: UTF-8 -*-
 import numpy as np
 from scipy.interpolate import CubicSpline
+from scipy.signal import lfilter
 
 # Project ：SLAMBox
 # File    ：smooth_vel.py
@@ -13,37 +14,108 @@ from scipy.interpolate import CubicSpline
 """
 
 
+def _spline_block(args):
+    time, speed, time_smooth = args
+    return CubicSpline(time, speed, axis=0)(time_smooth)
+
+
+def _blockwise_spline(time, speed, time_smooth, block_size, overlap, workers):
+    """
+    分块拟合三次样条：第k块负责采样点[s_k, s_{k+1})，拟合时向两侧各多取overlap个采样点，
+    块边界time[s_k]附近±overlap//2个采样点的范围内对相邻两块的结果线性加权，保证拼接处连续
+    """
+    assert block_size > overlap >= 2
+    n = len(time)
+    half = overlap // 2
+    starts = np.arange(block_size, n, block_size)
+    starts = starts[starts + half <= n - 1]  # 过短的尾块并入前一块
+    starts = np.concatenate([[0], starts, [n]])
+
+    # 每块负责的查询时间范围，以及块边界处的过渡区间
+    blend_lo = time[starts[1:-1] - half]
+    blend_hi = time[starts[1:-1] + half]
+    q_lo = np.searchsorted(time_smooth, np.concatenate([[-np.inf], blend_lo]), side='left')
+    q_hi = np.searchsorted(time_smooth, np.concatenate([blend_hi, [np.inf]]), side='left')
+
+    tasks = []
+    for k in range(len(starts) - 1):
+        lo, hi = max(starts[k] - overlap, 0), min(starts[k + 1] + overlap, n)
+        tasks.append((time[lo:hi], speed[lo:hi], time_smooth[q_lo[k]:q_hi[k]]))
+
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_spline_block, tasks))
+    else:
+        results = map(_spline_block, tasks)
+
+    speed_smooth = np.zeros((len(time_smooth),) + speed.shape[1:], dtype=np.float64)
+    for k, block in enumerate(results):
+        t = time_smooth[q_lo[k]:q_hi[k]]
+        weight = np.ones(len(t))
+        if k > 0:  # 与前一块的过渡区间
+            weight *= np.clip((t - blend_lo[k - 1]) / (blend_hi[k - 1] - blend_lo[k - 1]), 0, 1)
+        if k < len(starts) - 2:  # 与后一块的过渡区间
+            weight *= np.clip((blend_hi[k] - t) / (blend_hi[k] - blend_lo[k]), 0, 1)
+        speed_smooth[q_lo[k]:q_hi[k]] += weight.reshape((-1,) + (1,) * (speed.ndim - 1)) * block
+    return speed_smooth
+
+
 # 三次样条插值平滑
-def CubicSplineSmooth(wheel: np.ndarray):
-    assert wheel.ndim == 2 and wheel.shape[-1] == 2
+def CubicSplineSmooth(wheel: np.ndarray, time_smooth=None, block_size=None, overlap=20, workers=1):
+    """
+    三次样条插值平滑，所有速度列一次拟合
+
+    Args:
+        wheel: (n, 1+k)，第一列为时间，其余k列为速度
+        time_smooth: (m,) 可选的输出时间（需要递增），比如相机的时间戳，默认为原始时间范围内等间隔的n个点
+        block_size: 分块拟合时每块的采样点数，None表示整段拟合；分块时内存只与块大小有关
+        overlap: 分块拟合时每块向两侧多取的采样点数，块之间在±overlap//2个采样点内线性过渡
+        workers: 分块拟合时使用的进程数
+    Returns:
+        wheel_smooth: (m, 1+k)
+
+    """
+    assert wheel.ndim == 2 and wheel.shape[-1] >= 2
 
-    # 创建三次样条插值对象
     time = wheel[:, 0]
-    speed = wheel[:, 1]
-    cs = CubicSpline(time, speed)
+    speed = wheel[:, 1:]
 
     # 在原始时间序列数据的范围内生成平滑后的数据
-    time_smooth = np.linspace(time[0], time[-1], num=len(time), endpoint=True)
-    speed_smooth = cs(time_smooth)
+    if time_smooth is None:
+        time_smooth = np.linspace(time[0], time[-1], num=len(time), endpoint=True)
+    time_smooth = np.asarray(time_smooth, dtype=np.float64)
+
+    if block_size is None or block_size >= len(time):
+        speed_smooth = _spline_block((time, speed, time_smooth))
+    else:
+        speed_smooth = _blockwise_spline(time, speed, time_smooth, block_size, overlap, workers)
 
-    wheel_smooth = np.concatenate([time_smooth[..., None], speed_smooth[..., None]], axis=-1)
+    wheel_smooth = np.concatenate([time_smooth[..., None], speed_smooth], axis=-1)
     return wheel_smooth
 
 
+def _moving_average_valid(speeds: np.ndarray, window_size):
+    """
+    对(n, k)的速度按行做'valid'模式的移动平均，返回(n - window_size + 1, k)
+    每个输出只依赖自身窗口内的数据且累加顺序固定，因此分块计算与整体计算的结果逐位一致
+    """
+    m = len(speeds) - window_size + 1
+    if m <= 0:
+        return np.empty((0, speeds.shape[-1]), dtype=np.promote_types(speeds.dtype, np.float32))
+    acc = speeds[:m].astype(np.promote_types(speeds.dtype, np.float32))
+    for j in range(1, window_size):
+        acc += speeds[j:j + m]
+    acc /= window_size
+    return acc
+
+
 # 移动平均平滑
 def MoveAverage(wheel: np.ndarray, window_size=3):
     time = wheel[:, :1]
     speeds = wheel[:, 1:]
-    # 使用numpy的convolve函数实现移动平均
-    weights = np.repeat(1.0, window_size) / window_size
-    speeds_smooth = []
-
-    # 因为convolve仅支持一维操作
-    for speed in speeds.T:
-        speed_smooth = np.convolve(speed, weights, 'valid')  # 'valid'选项表示不使用填充
-        speeds_smooth.append(speed_smooth[..., None])
-
-    speeds_smooth = np.concatenate(speeds_smooth, axis=-1)
+    # 所有速度列一起做滑动窗口平均，'valid'模式不使用填充
+    speeds_smooth = _moving_average_valid(speeds, window_size)
 
     # 可以将y_smooth插入到x数组中，使其与原始数据对齐
     time_smooth = time[window_size // 2: len(time) - (window_size - 1) // 2]  # 头尾的数据被删去了
@@ -52,20 +124,162 @@ def MoveAverage(wheel: np.ndarray, window_size=3):
     return wheel_smooth
 
 
+def _exp_weight_filter(speed: np.ndarray, alpha, dtype, last):
+    """
+    一阶IIR形式的指数加权平均，last为上一个平滑输出(1, k)，返回(平滑结果, 最后一个平滑输出)
+    """
+    b = np.array([alpha], dtype=dtype)
+    a = np.array([1, alpha - 1], dtype=dtype)
+    zi = -a[1] * np.asarray(last, dtype=dtype)
+    speed_smooth = lfilter(b, a, speed, axis=0, zi=zi)[0]
+    return speed_smooth, speed_smooth[-1:]
+
+
 # 移动加权平滑
-def MoveAverageWithExpWeight(wheel: np.ndarray, alpha=0.2):
-    time = wheel[:, :1]
+def MoveAverageWithExpWeight(wheel: np.ndarray, alpha=0.2, out=None):
+    """
+    指数加权移动平均，s[i] = alpha * v[i] + (1 - alpha) * s[i-1]，s[0] = v[0]
+    使用一阶IIR滤波器(lfilter)对所有速度列一次性处理，没有逐点的python循环
+
+    Args:
+        wheel: (n, 1+k)，第一列为时间，其余k列为速度，支持float32/float64
+        alpha: 当前数据点的权重
+        out: 可选的输出缓冲区 (n, 1+k)，结果写入out并返回，也可以直接传入wheel原地计算；
+             lfilter不支持指定输出，内部仍会分配一个(n, k)的中间数组
+    Returns:
+        wheel_smooth: (n, 1+k)
+
+    """
+    dtype = wheel.dtype if wheel.dtype in (np.float32, np.float64) else np.float64
+    if out is None:
+        out = np.empty(wheel.shape, dtype=dtype)
+    assert out.shape == wheel.shape
+
     speed = wheel[:, 1:]
-    # 初始化平滑后的第一个数据点
-    speed_smooth = [speed[0]]
+    # 初始状态使得第一个输出恰好等于第一个输入
+    out[:, 1:] = _exp_weight_filter(speed, alpha, dtype, speed[:1])[0]
+    out[:, 0] = wheel[:, 0]
+    return out
 
-    # 逐个处理每个数据点
-    for i in range(1, len(speed)):
-        # 计算当前数据点的平滑值
-        speed_smooth.append(alpha * speed[i] + (1 - alpha) * speed_smooth[i - 1])
 
-    wheel_smooth = np.concatenate([time, np.array(speed_smooth)], axis=-1)
-    return wheel_smooth
+class StreamMoveAverage:
+    """
+    MoveAverage的流式版本，每次输入任意长度的(m, 1+k)数据块，只保留最近window_size-1行作为状态
+    所有块的输出拼接后与对整个序列调用MoveAverage的结果完全一致
+    """
+
+    def __init__(self, window_size=3):
+        self.window_size = window_size
+        self._tail = None
+
+    def update(self, chunk: np.ndarray):
+        """
+        Args:
+            chunk: (m, 1+k)，第一列为时间
+        Returns:
+            wheel_smooth: (m', 1+k)，本次可以确定的平滑结果，m'可能为0
+        """
+        buf = chunk if self._tail is None else np.concatenate([self._tail, chunk], axis=0)
+        self._tail = buf[max(len(buf) - self.window_size + 1, 0):].copy()
+        return MoveAverage(buf, self.window_size)
+
+    def reset(self):
+        self._tail = None
+
+
+class StreamExpWeight:
+    """
+    MoveAverageWithExpWeight的流式版本，状态只有上一个平滑输出
+    所有块的输出拼接后与对整个序列调用MoveAverageWithExpWeight的结果完全一致
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._last = None
+
+    def update(self, chunk: np.ndarray, out=None):
+        """
+        Args:
+            chunk: (m, 1+k)，第一列为时间
+            out: 可选的输出缓冲区 (m, 1+k)
+        Returns:
+            wheel_smooth: (m, 1+k)
+        """
+        if self._last is None:
+            out = MoveAverageWithExpWeight(chunk, self.alpha, out=out)
+            self._last = out[-1:, 1:].copy()
+            return out
+
+        dtype = chunk.dtype if chunk.dtype in (np.float32, np.float64) else np.float64
+        if out is None:
+            out = np.empty(chunk.shape, dtype=dtype)
+        out[:, 1:], last = _exp_weight_filter(chunk[:, 1:], self.alpha, dtype, self._last)
+        out[:, 0] = chunk[:, 0]
+        self._last = last.copy()
+        return out
+
+    def reset(self):
+        self._last = None
+
+
+class StreamCubicSpline:
+    """
+    三次样条平滑的流式版本，将速度重采样到 t0 + i * dt 的等间隔时间上
+    每个查询时间前后至少保留margin个原始采样点参与局部样条拟合，因此输出有margin个采样点的延迟，
+    状态只保留当前查询时间之前的margin个采样点。三次样条中远处节点的影响按约0.27^n衰减，
+    margin=20时与整段拟合的差异已在浮点误差量级
+    """
+
+    def __init__(self, dt, margin=20):
+        assert margin >= 2
+        self.dt = dt
+        self.margin = margin
+        self._buf = None
+        self._t0 = None
+        self._next = 0  # 下一个待输出的时间序号
+
+    def _emit(self, t_end):
+        buf = self._buf
+        n_end = int(np.floor((t_end - self._t0) / self.dt + 1e-9)) + 1
+        if n_end <= self._next or len(buf) < 2:
+            return np.empty((0, buf.shape[-1]), dtype=np.float64)
+        time_smooth = self._t0 + np.arange(self._next, n_end) * self.dt
+        speed_smooth = CubicSpline(buf[:, 0], buf[:, 1:], axis=0)(time_smooth)
+        self._next = n_end
+
+        # 丢弃下一个查询时间之前多余的采样点
+        first = np.searchsorted(buf[:, 0], self._t0 + self._next * self.dt, side='right') - 1
+        self._buf = buf[max(first - self.margin, 0):].copy()
+        return np.concatenate([time_smooth[..., None], speed_smooth], axis=-1)
+
+    def update(self, chunk: np.ndarray):
+        """
+        Args:
+            chunk: (m, 1+k)，第一列为时间
+        Returns:
+            wheel_smooth: (m', 1+k)，本次可以确定的平滑结果，m'可能为0
+        """
+        if self._buf is None:
+            self._buf = np.asarray(chunk, dtype=np.float64)
+            self._t0 = self._buf[0, 0]
+        else:
+            self._buf = np.concatenate([self._buf, chunk], axis=0)
+        if len(self._buf) <= self.margin:
+            return np.empty((0, self._buf.shape[-1]), dtype=np.float64)
+        return self._emit(self._buf[-1 - self.margin, 0])
+
+    def flush(self):
+        """
+        数据结束时调用，输出剩余的所有平滑结果
+        """
+        if self._buf is None:
+            return np.empty((0, 0), dtype=np.float64)
+        return self._emit(self._buf[-1, 0])
+
+    def reset(self):
+        self._buf = None
+        self._t0 = None
+        self._next = 0
 
 
 if __name__ == "__main__":
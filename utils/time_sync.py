@@ -0,0 +1,141 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：time_sync.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+多传感器时间同步：估计各数据流之间的固定时间偏移，并重采样到同一时钟
+"""
+
+
+def interp_sorted(t_new, t, x):
+    """
+    多列线性插值，t与t_new都需要递增，超出范围的部分取端点值（与np.interp一致）
+
+    Args:
+        t_new: (m,)
+        t: (n,)
+        x: (n,) 或 (n, k)
+    Returns:
+        x_new: (m,) 或 (m, k)
+    """
+    t_new, t, x = np.asarray(t_new, dtype=np.float64), np.asarray(t, dtype=np.float64), np.asarray(x)
+    right = np.clip(np.searchsorted(t, t_new, side='right'), 1, len(t) - 1)
+    left = right - 1
+    # 重复的时间戳（CAN日志中常见）会得到零宽度的区间，此时取区间的一个端点，不做除法
+    width = t[right] - t[left]
+    ratio = np.where(width > 0, (t_new - t[left]) / np.where(width > 0, width, 1), t_new >= t[right])
+    ratio = np.clip(ratio, 0, 1)
+    ratio = ratio.reshape((-1,) + (1,) * (x.ndim - 1))
+    return x[left] + ratio * (x[right] - x[left])
+
+
+def _median_rate(t):
+    return 1 / np.median(np.diff(t))
+
+
+def estimate_offset(t_ref, x_ref, t, x, rate=None, max_offset=None):
+    """
+    用FFT互相关估计固定时间偏移，x(t) ≈ x_ref(t + offset)，即数据流的时间加上offset后与参考流对齐
+
+    Args:
+        t_ref, x_ref: (n,) 参考数据流的时间和一维信号
+        t, x: (m,) 待估计数据流的时间和一维信号，需要与参考信号有可比性，比如IMU的z轴角速度与阿克曼模型的角速度
+        rate: 互相关时重采样的频率，默认取两者中较高的采样率
+        max_offset: 允许的最大偏移量（秒）
+    Returns:
+        offset: 秒，精确到亚采样（峰值处抛物线插值）
+    """
+    if rate is None:
+        rate = max(_median_rate(t_ref), _median_rate(t))
+    dt = 1 / rate
+
+    # 在两者共同的时间范围内等间隔重采样
+    grid = np.arange(max(t_ref[0], t[0]), min(t_ref[-1], t[-1]), dt)
+    assert len(grid) > 2, "streams do not overlap"
+    a = interp_sorted(grid, t_ref, x_ref)
+    b = interp_sorted(grid, t, x)
+    a = a - a.mean()
+    b = b - b.mean()
+
+    # sab[lag] = sum_i a[i + lag] * b[i]，补零避免循环相关
+    n = len(grid)
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    sab = np.fft.irfft(np.fft.rfft(a, nfft) * np.conj(np.fft.rfft(b, nfft)), nfft)
+    lags = np.arange(-(n // 2), n // 2 + 1)
+    sab = sab[lags % nfft]
+
+    # 每个lag只在重叠部分上计算皮尔逊相关系数，重叠部分的和与平方和由前缀和得到
+    ca = np.concatenate([[0], np.cumsum(a)])
+    caa = np.concatenate([[0], np.cumsum(a * a)])
+    cb = np.concatenate([[0], np.cumsum(b)])
+    cbb = np.concatenate([[0], np.cumsum(b * b)])
+    a_lo, a_hi = np.maximum(lags, 0), n + np.minimum(lags, 0)
+    b_lo, b_hi = np.maximum(-lags, 0), n - np.maximum(lags, 0)
+    m = a_hi - a_lo
+    sa, saa = ca[a_hi] - ca[a_lo], caa[a_hi] - caa[a_lo]
+    sb, sbb = cb[b_hi] - cb[b_lo], cbb[b_hi] - cbb[b_lo]
+    var = np.maximum((saa - sa * sa / m) * (sbb - sb * sb / m), 1e-24)
+    corr = (sab - sa * sb / m) / np.sqrt(var)
+    if max_offset is not None:
+        keep = np.abs(lags) * dt <= max_offset
+        lags, corr = lags[keep], corr[keep]
+
+    peak = int(np.argmax(corr))
+    shift = 0.0
+    if 0 < peak < len(corr) - 1:
+        c0, c1, c2 = corr[peak - 1], corr[peak], corr[peak + 1]
+        denom = c0 - 2 * c1 + c2
+        if denom != 0:
+            shift = 0.5 * (c0 - c2) / denom
+    return (lags[peak] + shift) * dt
+
+
+def synchronize(streams: dict, reference=None, signals=None, rate=None, estimate=True, max_offset=1.0):
+    """
+    将多个不同频率的数据流对齐到同一个时钟
+
+    Args:
+        streams: {name: (t, x)}，t为(n,)的递增时间（秒），x为(n,)或(n, k)
+        reference: 参考数据流的名字，默认为第一个
+        signals: {name: (n,)} 用于估计时间偏移的一维信号，默认取x的第一列
+        rate: 输出时钟的频率，默认为参考数据流的采样率
+        estimate: 是否估计时间偏移，否则只做重采样
+        max_offset: 允许的最大时间偏移（秒）
+    Returns:
+        clock: (m,) 统一的时钟（参考数据流的时间）
+        aligned: {name: (m,) 或 (m, k)} 重采样后的数据
+        offsets: {name: offset}，各数据流的时间加上offset后与参考流对齐
+    """
+    names = list(streams.keys())
+    reference = names[0] if reference is None else reference
+    signals = {} if signals is None else signals
+
+    def signal_of(name):
+        if name in signals:
+            return np.asarray(signals[name])
+        x = np.asarray(streams[name][1])
+        return x if x.ndim == 1 else x[:, 0]
+
+    t_ref = np.asarray(streams[reference][0], dtype=np.float64)
+    offsets = {}
+    for name in names:
+        if name == reference or not estimate:
+            offsets[name] = 0.0
+        else:
+            offsets[name] = estimate_offset(t_ref, signal_of(reference), np.asarray(streams[name][0], dtype=np.float64),
+                                            signal_of(name), max_offset=max_offset)
+
+    # 所有数据流校正后的共同时间范围
+    start = max(streams[name][0][0] + offsets[name] for name in names)
+    end = min(streams[name][0][-1] + offsets[name] for name in names)
+    rate = _median_rate(t_ref) if rate is None else rate
+    clock = np.arange(start, end, 1 / rate)
+
+    aligned = {name: interp_sorted(clock, np.asarray(streams[name][0], dtype=np.float64) + offsets[name], streams[name][1])
+               for name in names}
+    return clock, aligned, offsets
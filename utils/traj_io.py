@@ -0,0 +1,193 @@
+# -*- coding: UTF-8 -*-
+import os
+import json
+
+import numpy as np
+
+from utils import se3
+
+# Project ：SLAMBox
+# File    ：traj_io.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+TUM和KITTI格式轨迹的读写。文本按块解析，解析结果可以保存为同名的.npy缓存，之后直接内存映射读取；
+写入时按块格式化，不拼接整个文件的字符串
+"""
+
+TUM_COLUMNS = 8  # timestamp tx ty tz qx qy qz qw
+KITTI_COLUMNS = 12  # 3x4位姿按行展开
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _filter_lines(chunk: bytes):
+    """
+    去掉注释和只包含空白字符的行
+    """
+    lines = [line for line in chunk.split(b"\n") if line.strip() and not line.lstrip().startswith(b"#")]
+    return b"\n".join(lines) + b"\n" if lines else b""
+
+
+def _parse_values(chunk: bytes):
+    rows = chunk.count(b"\n")
+    return np.fromstring(chunk.replace(b",", b" ").decode('ascii'), sep=' ') if rows else np.empty(0), rows
+
+
+def _parse_chunk(chunk: bytes, columns, path):
+    filtered = b"#" in chunk or b"\n\n" in chunk or chunk.startswith(b"\n")
+    if filtered:
+        chunk = _filter_lines(chunk)
+    values, rows = _parse_values(chunk)
+    if values.size != rows * columns and not filtered:
+        # 只包含空白字符的行（比如"   \n"）不产生数值但计入行数，去掉这些行后重新解析，正常的块不需要额外的查找
+        values, rows = _parse_values(_filter_lines(chunk))
+    if values.size != rows * columns:
+        raise ValueError(f"{path}: expected {columns} numbers per line")
+    return values.reshape(rows, columns)
+
+
+def parse_text(path, columns, chunk_bytes=64 << 20):
+    """
+    按块解析空白（或逗号）分隔的数值文本，忽略#开头的注释行和空行
+
+    Args:
+        path: 文本路径
+        columns: 每行的列数
+        chunk_bytes: 每次读取的字节数，块在换行处截断
+    Returns:
+        data: (n, columns) float64
+    """
+    blocks = []
+    rest = b""
+    with open(path, "rb") as fp:
+        while True:
+            data = fp.read(chunk_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            rest = data[cut:]
+            if cut:
+                blocks.append(_parse_chunk(data[:cut], columns, path))
+    if rest.strip():
+        blocks.append(_parse_chunk(rest + b"\n", columns, path))
+    return np.concatenate(blocks) if blocks else np.empty((0, columns))
+
+
+def _load(path, columns, cache, mmap):
+    """
+    优先读取{path}.npy缓存，缓存不存在或者源文件被修改时重新解析
+    """
+    if not cache:
+        return parse_text(path, columns)
+
+    cache_path, meta_path = path + ".npy", path + ".npy.json"
+    stamp = _source_stamp(path)
+    if os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding='utf8') as fp:
+            if json.load(fp) == stamp:
+                return np.load(cache_path, mmap_mode='r' if mmap else None)
+
+    data = parse_text(path, columns)
+    try:
+        tmp_path = cache_path + f".tmp{os.getpid()}.npy"
+        np.save(tmp_path, data)
+        os.replace(tmp_path, cache_path)
+        with open(meta_path, "w", encoding='utf8') as fp:
+            json.dump(stamp, fp)
+    except OSError as e:
+        # 只读的数据目录不写缓存
+        print(f"skip trajectory cache of {path}: {e}")
+    return data
+
+
+def read_tum(path, cache=True, mmap=True):
+    """
+    Args:
+        path: TUM格式轨迹，每行为timestamp tx ty tz qx qy qz qw
+        cache: 是否使用/生成{path}.npy缓存
+        mmap: 缓存是否以只读内存映射的方式打开
+    Returns:
+        traj: (n, 8)，可以直接给plot_tum使用
+    """
+    return _load(path, TUM_COLUMNS, cache, mmap)
+
+
+def read_kitti(path, cache=True, mmap=True):
+    """
+    Args:
+        path: KITTI格式轨迹，每行为3x4位姿矩阵按行展开的12个数
+    Returns:
+        pose: (n, 4, 4)，可以直接给plot_pose使用
+    """
+    data = _load(path, KITTI_COLUMNS, cache, mmap)
+    data = data.reshape(-1, 3, 4)
+    return se3.from_rt(data[:, :, :3], data[:, :, 3])
+
+
+def _write(path, data, fmt, chunk_rows):
+    line = " ".join(fmt) + "\n"
+    tmp_path = path + f".tmp{os.getpid()}"
+    with open(tmp_path, "w") as fp:
+        for start in range(0, len(data), chunk_rows):
+            chunk = np.asarray(data[start:start + chunk_rows], dtype=np.float64)
+            fp.write((line * len(chunk)) % tuple(chunk.ravel()))
+    os.replace(tmp_path, path)
+
+
+def write_tum(path, traj: np.ndarray, precision=9, chunk_rows=1 << 16):
+    """
+    Args:
+        traj: (n, 8) timestamp tx ty tz qx qy qz qw
+        precision: 小数位数，时间戳固定为6位（微秒）
+        chunk_rows: 每次格式化的行数
+    """
+    _write(path, traj, ["%.6f"] + [f"%.{precision}f"] * 7, chunk_rows)
+
+
+def write_kitti(path, pose: np.ndarray, precision=9, chunk_rows=1 << 16):
+    """
+    Args:
+        pose: (n, 4, 4)或(n, 3, 4)
+    """
+    _write(path, np.asarray(pose)[:, :3, :4].reshape(-1, KITTI_COLUMNS), [f"%.{precision}e"] * KITTI_COLUMNS, chunk_rows)
+
+
+def tum_to_pose(traj: np.ndarray):
+    """
+    Returns:
+        timestamp: (n,), pose: (n, 4, 4)
+    """
+    return np.asarray(traj[:, 0]), se3.from_vector(traj[:, 1:8])
+
+
+def pose_to_tum(timestamp: np.ndarray, pose: np.ndarray):
+    """
+    Returns:
+        traj: (n, 8)
+    """
+    traj = np.empty((len(pose), TUM_COLUMNS))
+    traj[:, 0] = timestamp
+    se3.to_vector(pose, out=traj[:, 1:8])
+    return traj
+
+
+if __name__ == '__main__':
+    import time
+
+    num_poses = 1000000
+    timestamp = np.arange(num_poses) * 0.01
+    pose = np.tile(np.eye(4), (num_poses, 1, 1))
+    pose[:, 0, 3] = np.cumsum(np.full(num_poses, 0.1))
+    write_tum("/tmp/traj_tum.txt", pose_to_tum(timestamp, pose))
+
+    for cache in [False, True, True]:
+        start = time.perf_counter()
+        traj = read_tum("/tmp/traj_tum.txt", cache=cache)
+        print(f"cache={cache}: {len(traj)} poses in {time.perf_counter() - start:.3f}s")
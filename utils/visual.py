@@ -3,83 +3,128 @@ import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from pyrotation.conversion import matrix_from_quaternion, matrix_from_euler_angle, fill_matrix
+from pyrotation.conversion import matrix_from_euler_angle
+
+from utils import se3
 
 
 # File    ：visual.py
 # Author  ：fzhiheng
 # Date    ：2023/11/27
 
-def plot_pose(fig, pose: np.ndarray, name: str, row=1, col=1, align_first=False, axis_length=8, inter=100, mark_start=True, mark_end=True, show_legend=True):
+def simplify_polyline(points: np.ndarray, tolerance: float):
     """
+    Ramer-Douglas-Peucker折线简化，保证原始的每个点到简化后折线的距离不超过tolerance。
+    按层迭代，每一轮对所有未收敛的线段一起向量化计算最远点，轮数约为log(n)
 
     Args:
-        pose: (n, 4, 4)
+        points: (n, d)
+        tolerance: 距离阈值，与points单位相同
     Returns:
-
+        keep: (m,) 保留的点的下标，升序，始终包含首尾两点
     """
-    if align_first:
-        pose = np.linalg.inv(pose[:1, :, :]) @ pose  # (n, 4, 4)
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n <= 2 or tolerance is None or tolerance <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    active = np.ones(n, dtype=bool)  # 所在线段还没有收敛的点
+    while True:
+        candidates = np.flatnonzero(active & ~keep)
+        if len(candidates) == 0:
+            break
+        kept = np.flatnonzero(keep)
+        seg = np.searchsorted(kept, candidates, side='right') - 1
+        a, b = points[kept[seg]], points[kept[seg + 1]]
+
+        # 点到线段（而不是直线）的距离，轨迹折返时也能保证误差
+        ab = b - a
+        ap = points[candidates] - a
+        length2 = np.einsum('ij,ij->i', ab, ab)
+        s = np.clip(np.einsum('ij,ij->i', ap, ab) / np.where(length2 > 0, length2, 1), 0, 1)
+        dist = np.linalg.norm(ap - s[:, None] * ab, axis=-1)
+
+        # candidates按线段连续排列，分组求最远点
+        starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+        group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(seg)]))
+        dmax = np.maximum.reduceat(dist, starts)
+        _, farthest = np.unique(group[dist == dmax[group]], return_index=True)
+        farthest = np.flatnonzero(dist == dmax[group])[farthest]
+
+        split = dmax > tolerance
+        keep[candidates[farthest[split]]] = True
+        active[candidates[~split[group]]] = False
+    return np.flatnonzero(keep)
+
+
+def _array(values, binary):
+    """
+    binary为True时转换为float32的numpy数组，plotly>=6会将其按二进制(base64)编码写入json，而不是逐个数字的文本
+    """
+    return np.ascontiguousarray(values, dtype=np.float32) if binary else values
+
 
-    x, y, z = pose[:, 0, 3], pose[:, 1, 3], pose[:, 2, 3]
-    fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='lines', name=name), row=row, col=col)
+def _plot_line(fig, xyz, name, row, col, mark_start, mark_end, tolerance, binary):
+    keep = simplify_polyline(xyz, tolerance)
+    line = _array(xyz[keep], binary)
+    fig.add_trace(go.Scatter3d(x=line[:, 0], y=line[:, 1], z=line[:, 2], mode='lines', name=name), row=row, col=col)
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
     if mark_start:
         fig.add_trace(go.Scatter3d(x=[x[0]], y=[y[0]], z=[z[0]], mode='markers', name=f"{name} start point"), row=row, col=col)
     if mark_end:
         fig.add_trace(go.Scatter3d(x=[x[-1]], y=[y[-1]], z=[z[-1]], mode='markers', name=f"{name} end point"), row=row, col=col)
+    return len(keep) / max(len(xyz), 1)
+
 
-    start_points = []
-    x_axis_end = []
-    y_axis_end = []
-    z_axis_end = []
-    for i, (R, t) in enumerate(zip(pose[:, :3, :3], pose[:, :3, 3])):
-        if i % inter == 0:
-            point = t
-            x_end = R[:, 0] * axis_length + point
-            y_end = R[:, 1] * axis_length + point
-            z_end = R[:, 2] * axis_length + point
-
-            start_points.append(point)
-            x_axis_end.append(x_end)
-            y_axis_end.append(y_end)
-            z_axis_end.append(z_end)
-
-    show_legend = show_legend
-    for start_point, x_, y_, z_ in zip(start_points, x_axis_end, y_axis_end, z_axis_end):
-        # 使用红色表示x轴
-        fig.add_trace(go.Scatter3d(x=[start_point[0], x_[0]], y=[start_point[1], x_[1]], z=[start_point[2], x_[2]],
-                                   mode='lines', name="x-axis", marker=dict(color='red'), showlegend=show_legend), row=row, col=col)
-        # 使用绿色表示y轴
-        fig.add_trace(go.Scatter3d(x=[start_point[0], y_[0]], y=[start_point[1], y_[1]], z=[start_point[2], y_[2]],
-                                   mode='lines', name="y-axis", marker=dict(color='green'), showlegend=show_legend), row=row, col=col)
-        # 使用蓝色表示z轴
-        fig.add_trace(go.Scatter3d(x=[start_point[0], z_[0]], y=[start_point[1], z_[1]], z=[start_point[2], z_[2]],
-                                   mode='lines', name="z-axis", marker=dict(color='blue'), showlegend=show_legend), row=row, col=col)
-        show_legend = False
-
-
-def plot_xyz(fig, xyz: np.ndarray, name: str, row=1, col=1, mark_start=True, mark_end=True):
+def plot_pose(fig, pose: np.ndarray, name: str, row=1, col=1, align_first=False, axis_length=8, inter=100, mark_start=True, mark_end=True, show_legend=True,
+              tolerance=None, binary=False):
     """
 
     Args:
-        xyz: (n, 3)
+        pose: (n, 4, 4)
+        tolerance: 轨迹简化的距离阈值，None表示不简化，坐标轴仍然按原始的每隔inter个位姿绘制
+        binary: 是否以float32二进制编码数据
     Returns:
+        ratio: 绘制的轨迹点数与原始点数之比
+    """
+    if align_first:
+        pose = se3.relative(pose[:1], pose)  # (n, 4, 4)
 
+    ratio = _plot_line(fig, pose[:, :3, 3], name, row, col, mark_start, mark_end, tolerance, binary)
+
+    # 每隔inter个位姿画一个坐标轴，每个轴的所有线段合并成一条轨迹，线段之间用nan断开（plotly中nan与None一样不连线）
+    R, t = pose[::inter, :3, :3], pose[::inter, :3, 3]  # (m, 3, 3), (m, 3)
+    for axis, (axis_name, color) in enumerate([("x-axis", 'red'), ("y-axis", 'green'), ("z-axis", 'blue')]):
+        segments = np.full((len(t), 3, 3), np.nan)  # (m, [起点, 终点, 断开], xyz)
+        segments[:, 0] = t
+        segments[:, 1] = t + R[:, :, axis] * axis_length
+        segments = _array(segments.reshape(-1, 3), binary)
+        fig.add_trace(go.Scatter3d(x=segments[:, 0], y=segments[:, 1], z=segments[:, 2], mode='lines', name=axis_name,
+                                   marker=dict(color=color), showlegend=show_legend), row=row, col=col)
+    return ratio
+
+
+def plot_xyz(fig, xyz: np.ndarray, name: str, row=1, col=1, mark_start=True, mark_end=True, tolerance=None, binary=False):
     """
-    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
-    fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='lines', name=name), row=row, col=col)
-    if mark_start:
-        fig.add_trace(go.Scatter3d(x=[x[0]], y=[y[0]], z=[z[0]], mode='markers', name=f"{name} start point"), row=row, col=col)
-    if mark_end:
-        fig.add_trace(go.Scatter3d(x=[x[-1]], y=[y[-1]], z=[z[-1]], mode='markers', name=f"{name} end point"), row=row, col=col)
+
+    Args:
+        xyz: (n, 3)
+        tolerance: 轨迹简化的距离阈值，None表示不简化
+        binary: 是否以float32二进制编码数据
+    Returns:
+        ratio: 绘制的轨迹点数与原始点数之比
+    """
+    return _plot_line(fig, np.asarray(xyz), name, row, col, mark_start, mark_end, tolerance, binary)
 
 
-def plot_tum(fig, traj, name, row=1, col=1, align_first=False, axis_length=8, inter=100, mark_start=True, mark_end=True, show_legend=True):
-    matrix = matrix_from_quaternion(np.roll(traj[:, 4:], 1, axis=-1))  # (n, 3, 3)
-    full_matrix = fill_matrix(matrix, traj[:, 1:4])
-    plot_pose(fig, full_matrix, name, row=row, col=col, align_first=align_first, axis_length=axis_length, inter=inter, mark_start=mark_start,
-              mark_end=mark_end,
-              show_legend=show_legend)
+def plot_tum(fig, traj, name, row=1, col=1, align_first=False, axis_length=8, inter=100, mark_start=True, mark_end=True, show_legend=True,
+             tolerance=None, binary=False):
+    full_matrix = se3.from_vector(traj[:, 1:8])  # (n, 4, 4)
+    return plot_pose(fig, full_matrix, name, row=row, col=col, align_first=align_first, axis_length=axis_length, inter=inter, mark_start=mark_start,
+                     mark_end=mark_end,
+                     show_legend=show_legend, tolerance=tolerance, binary=binary)
 
 
 if __name__ == "__main__":
@@ -104,6 +149,7 @@ if __name__ == "__main__":
 
     # plot
     fig = make_subplots(rows=1, cols=1, specs=[[{'type': 'scatter3d'}]])
-    plot_pose(fig, T, "traj", row=1, col=1, align_first=True, axis_length=2, inter=20, mark_start=True)
+    ratio = plot_pose(fig, T, "traj", row=1, col=1, align_first=True, axis_length=2, inter=20, mark_start=True, tolerance=0.05, binary=True)
+    print(f"keep {ratio:.1%} points")
     fig.update_layout(scene=dict(aspectmode='data'))
     fig.show()
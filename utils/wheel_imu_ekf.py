@@ -0,0 +1,268 @@
+# -*- coding: UTF-8 -*-
+import math
+
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：wheel_imu_ekf.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+轮速/IMU融合的平面EKF。状态为[x, y, yaw, w, b]：轮速和阿克曼模型得到的线速度v和角速度w_wheel作为过程模型的输入，
+陀螺仪z轴测量w + b，同时估计位姿和陀螺仪零偏。
+协方差对称，只保存15个独立元素，预测和更新都展开成标量运算，主循环中不创建numpy临时数组。
+run和step各自展开了同一套预测/更新（抽成共用函数后run慢约30%），修改模型时两处要同时修改，
+tests/test_wheel_imu_ekf.py检查两者的结果逐位相同
+"""
+
+STATE_NAMES = ("x", "y", "yaw", "w", "b")
+
+
+class WheelImuEKF:
+    def __init__(self, speed_std=0.1, yaw_rate_std=0.02, bias_walk=1e-4, gyro_std=0.005, bias_std=0.01):
+        """
+
+        Args:
+            speed_std: 轮速线速度噪声（m/s）
+            yaw_rate_std: 阿克曼角速度的不确定度（rad/s），越大越相信陀螺仪
+            bias_walk: 零偏随机游走（rad/s/√s）
+            gyro_std: 陀螺仪测量噪声（rad/s）
+            bias_std: 零偏的初始标准差（rad/s）
+        """
+        self.speed_var = speed_std ** 2
+        self.yaw_rate_var = yaw_rate_std ** 2
+        self.bias_walk_var = bias_walk ** 2
+        self.gyro_var = gyro_std ** 2
+        self.bias_var = bias_std ** 2
+        # 状态和协方差的15个独立元素以python float保存，run和step中直接解包，不经过numpy
+        self._x = [0.0] * 5
+        self._p = [0.0] * 15  # xx xy xt xw xb yy yt yw yb tt tw tb ww wb bb
+        self._step_out = np.empty(5)
+        self.time = None
+        self.reset()
+
+    def reset(self, x=0.0, y=0.0, yaw=0.0, bias=0.0):
+        self._x = [float(x), float(y), float(yaw), 0.0, float(bias)]
+        self._p = [0.0] * 15
+        self._p[12] = self.yaw_rate_var
+        self._p[14] = self.bias_var
+        self.time = None
+
+    @property
+    def state(self):
+        """
+        Returns:
+            (5,) 当前状态的副本
+        """
+        return np.array(self._x)
+
+    @property
+    def P(self):
+        """
+        Returns:
+            (5, 5) 当前协方差的副本
+        """
+        P = np.empty((5, 5))
+        P[np.triu_indices(5)] = self._p
+        P[np.tril_indices(5, -1)] = P.T[np.tril_indices(5, -1)]
+        return P
+
+    def step(self, time, v, w_wheel, gyro=None):
+        """
+        处理一个时刻的输入，gyro为None或nan表示这一时刻没有陀螺仪测量。
+        与run的逐步计算相同，不创建numpy临时数组，结果写入同一个预先分配的缓冲区；
+        状态和协方差以python float列表保存，每次调用仍会新建这两个小列表
+
+        Returns:
+            state: (5,) 内部缓冲区，下一次调用step时会被覆盖
+        """
+        x, y, th, w, b = self._x
+        pxx, pxy, pxt, pxw, pxb, pyy, pyt, pyw, pyb, ptt, ptw, ptb, pww, pwb, pbb = self._p
+        dt = 0.0 if self.time is None else time - self.time
+        self.time = time
+
+        # 预测，与run中的循环体相同
+        c, s = math.cos(th), math.sin(th)
+        a = -v * s * dt
+        e = v * c * dt
+        x += v * c * dt
+        y += v * s * dt
+        th += w * dt
+        w = w_wheel
+
+        qxx, qxy, qxt, qxw, qxb = pxx + a * pxt, pxy + a * pyt, pxt + a * ptt, pxw + a * ptw, pxb + a * ptb
+        qyy, qyt, qyw, qyb = pyy + e * pyt, pyt + e * ptt, pyw + e * ptw, pyb + e * ptb
+        qtt, qtw, qtb = ptt + dt * ptw, ptw + dt * pww, ptb + dt * pwb
+        vdt2 = self.speed_var * dt * dt
+        pxx = qxx + a * qxt + vdt2 * c * c
+        pxy = qxy + e * qxt + vdt2 * c * s
+        pxt = qxt + dt * qxw
+        pxb = qxb
+        pyy = qyy + e * qyt + vdt2 * s * s
+        pyt = qyt + dt * qyw
+        pyb = qyb
+        pbb += self.bias_walk_var * dt
+        ptt = qtt + dt * qtw
+        ptb = qtb
+        pxw = pyw = ptw = pwb = 0.0
+        pww = self.yaw_rate_var
+
+        # 更新
+        if gyro is not None and not math.isnan(gyro):
+            hx, hy, ht, hw, hb = pxw + pxb, pyw + pyb, ptw + ptb, pww + pwb, pwb + pbb
+            inv_s = 1.0 / (hw + hb + self.gyro_var)
+            r = (gyro - w - b) * inv_s
+            x += hx * r
+            y += hy * r
+            th += ht * r
+            w += hw * r
+            b += hb * r
+            kx, ky, kt, kw, kb = hx * inv_s, hy * inv_s, ht * inv_s, hw * inv_s, hb * inv_s
+            pxx -= kx * hx
+            pxy -= kx * hy
+            pxt -= kx * ht
+            pxw -= kx * hw
+            pxb -= kx * hb
+            pyy -= ky * hy
+            pyt -= ky * ht
+            pyw -= ky * hw
+            pyb -= ky * hb
+            ptt -= kt * ht
+            ptw -= kt * hw
+            ptb -= kt * hb
+            pww -= kw * hw
+            pwb -= kw * hb
+            pbb -= kb * hb
+
+        self._x = [x, y, th, w, b]
+        self._p = [pxx, pxy, pxt, pxw, pxb, pyy, pyt, pyw, pyb, ptt, ptw, ptb, pww, pwb, pbb]
+        out = self._step_out
+        out[0], out[1], out[2], out[3], out[4] = x, y, th, w, b
+        return out
+
+    def run(self, time, v, w_wheel, gyro=None, out=None):
+        """
+        按时间顺序处理整段数据，从当前状态继续
+
+        Args:
+            time: (n,) 时间戳（秒）
+            v: (n,) 线速度
+            w_wheel: (n,) 阿克曼模型的角速度
+            gyro: (n,) 陀螺仪z轴角速度，nan表示该时刻没有测量；None表示全部没有
+            out: (n, 5) 预先分配的输出
+        Returns:
+            out: (n, 5) 每个时刻更新后的状态
+        """
+        n = len(time)
+        out = np.empty((n, 5)) if out is None else out
+        time = time.tolist() if isinstance(time, np.ndarray) else time
+        v = v.tolist() if isinstance(v, np.ndarray) else v
+        w_wheel = w_wheel.tolist() if isinstance(w_wheel, np.ndarray) else w_wheel
+        gyro = [math.nan] * n if gyro is None else (gyro.tolist() if isinstance(gyro, np.ndarray) else gyro)
+
+        speed_var, yaw_rate_var, bias_walk_var, gyro_var = self.speed_var, self.yaw_rate_var, self.bias_walk_var, self.gyro_var
+        cos, sin, isnan = math.cos, math.sin, math.isnan
+        x, y, th, w, b = self._x
+        pxx, pxy, pxt, pxw, pxb, pyy, pyt, pyw, pyb, ptt, ptw, ptb, pww, pwb, pbb = self._p
+        last = time[0] if self.time is None else self.time
+
+        for i in range(n):
+            t = time[i]
+            dt = t - last
+            last = t
+            vi = v[i]
+
+            # 预测，与step相同
+            c, s = cos(th), sin(th)
+            a = -vi * s * dt  # dx/dyaw
+            e = vi * c * dt  # dy/dyaw
+            x += vi * c * dt
+            y += vi * s * dt
+            th += w * dt
+            w = w_wheel[i]
+
+            # P' = F P F^T + Q，F只有x, y, yaw, b四行非零，w被输入重置
+            qxx, qxy, qxt, qxw, qxb = pxx + a * pxt, pxy + a * pyt, pxt + a * ptt, pxw + a * ptw, pxb + a * ptb
+            qyy, qyt, qyw, qyb = pyy + e * pyt, pyt + e * ptt, pyw + e * ptw, pyb + e * ptb
+            qtt, qtw, qtb = ptt + dt * ptw, ptw + dt * pww, ptb + dt * pwb
+            vdt2 = speed_var * dt * dt
+            pxx = qxx + a * qxt + vdt2 * c * c
+            pxy = qxy + e * qxt + vdt2 * c * s
+            pxt = qxt + dt * qxw
+            pxb = qxb
+            pyy = qyy + e * qyt + vdt2 * s * s
+            pyt = qyt + dt * qyw
+            pyb = qyb
+            pbb += bias_walk_var * dt
+            ptt = qtt + dt * qtw
+            ptb = qtb
+            pxw = pyw = ptw = pwb = 0.0
+            pww = yaw_rate_var
+
+            # 更新：z = w + b，H = [0, 0, 0, 1, 1]
+            z = gyro[i]
+            if not isnan(z):
+                hx, hy, ht, hw, hb = pxw + pxb, pyw + pyb, ptw + ptb, pww + pwb, pwb + pbb
+                inv_s = 1.0 / (hw + hb + gyro_var)
+                r = (z - w - b) * inv_s
+                x += hx * r
+                y += hy * r
+                th += ht * r
+                w += hw * r
+                b += hb * r
+                # P -= h h^T / S
+                kx, ky, kt, kw, kb = hx * inv_s, hy * inv_s, ht * inv_s, hw * inv_s, hb * inv_s
+                pxx -= kx * hx
+                pxy -= kx * hy
+                pxt -= kx * ht
+                pxw -= kx * hw
+                pxb -= kx * hb
+                pyy -= ky * hy
+                pyt -= ky * ht
+                pyw -= ky * hw
+                pyb -= ky * hb
+                ptt -= kt * ht
+                ptw -= kt * hw
+                ptb -= kt * hb
+                pww -= kw * hw
+                pwb -= kw * hb
+                pbb -= kb * hb
+
+            out[i] = (x, y, th, w, b)
+
+        self.time = last
+        self._x = [x, y, th, w, b]
+        self._p = [pxx, pxy, pxt, pxw, pxb, pyy, pyt, pyw, pyb, ptt, ptw, ptb, pww, pwb, pbb]
+        return out
+
+
+if __name__ == '__main__':
+    import time as timer
+
+    num_steps = 1000000
+    rng = np.random.default_rng(0)
+    time = np.arange(num_steps) * 0.01
+    v = 10 + np.sin(time * 0.1)
+    w_true = 0.1 * np.sin(time * 0.05)
+    w_wheel = w_true + rng.normal(0, 0.02, num_steps)
+    gyro = w_true + 0.02 + rng.normal(0, 0.005, num_steps)
+
+    ekf = WheelImuEKF()
+    out = np.empty((num_steps, 5))
+    start = timer.perf_counter()
+    ekf.run(time, v, w_wheel, gyro, out=out)
+    seconds = timer.perf_counter() - start
+    print(f"run:  {num_steps} updates in {seconds:.2f}s, {num_steps / seconds / 1000:.0f}k updates/s")
+    print(f"estimated gyro bias {out[-1, 4]:.4f} (true 0.0200)")
+
+    # 逐个时刻输入，比如在线处理CAN消息
+    samples = list(zip(time.tolist(), v.tolist(), w_wheel.tolist(), gyro.tolist()))
+    ekf.reset()
+    step = ekf.step
+    start = timer.perf_counter()
+    for t, vi, wi, gi in samples:
+        step(t, vi, wi, gi)
+    seconds = timer.perf_counter() - start
+    print(f"step: {num_steps} updates in {seconds:.2f}s, {num_steps / seconds / 1000:.0f}k updates/s")
@@ -0,0 +1,126 @@
+# -*- coding: UTF-8 -*-
+import numpy as np
+
+# Project ：SLAMBox
+# File    ：window_stats.py
+# Author  ：fzhiheng
+# Date    ：2026/10/18
+
+
+"""
+基于前缀和的滑动窗口统计，以及由此得到的静止检测和IMU重力/零偏初始化
+"""
+
+
+def window_stats(time, values, duration, starts=None):
+    """
+    统计所有时间窗口[start, start + duration]内数据的均值、方差和采样个数，
+    窗口边界由有序查找得到，求和由前缀和得到，总复杂度O(n + m log n)
+
+    Args:
+        time: (n,) 递增的时间
+        values: (n,) 或 (n, k)
+        duration: 窗口时长，与time单位一致
+        starts: (m,) 窗口的起始时间，默认以每个采样点为起点
+    Returns:
+        mean: (m,) 或 (m, k)，空窗口为nan
+        var: (m,) 或 (m, k)，总体方差
+        count: (m,)
+    """
+    time = np.asarray(time)
+    values = np.asarray(values, dtype=np.float64)
+    starts = time if starts is None else np.asarray(starts)
+
+    lo = np.searchsorted(time, starts, side='left')
+    hi = np.searchsorted(time, starts + duration, side='right')
+    count = hi - lo
+
+    # 减去整体均值后再累加，减小平方和相减时的误差
+    center = values.mean(axis=0)
+    x = values - center
+    zero = np.zeros((1,) + values.shape[1:])
+    s1 = np.concatenate([zero, np.cumsum(x, axis=0)], axis=0)
+    s2 = np.concatenate([zero, np.cumsum(x * x, axis=0)], axis=0)
+
+    c = count.reshape((-1,) + (1,) * (values.ndim - 1)).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = (s1[hi] - s1[lo]) / c
+        var = np.maximum((s2[hi] - s2[lo]) / c - mean_x * mean_x, 0)
+    return mean_x + center, var, count
+
+
+def detect_static(time, acc, duration, gyro=None, acc_std=0.05, gyro_std=0.01, min_count=2):
+    """
+    静止检测：以每个采样点为起点的窗口内，加速度（和角速度）各轴标准差都小于阈值时认为静止
+
+    Args:
+        time: (n,) 递增的时间
+        acc: (n, 3) 加速度
+        duration: 窗口时长
+        gyro: (n, 3) 可选的角速度，与acc同一时间
+        acc_std: 加速度标准差阈值
+        gyro_std: 角速度标准差阈值
+        min_count: 窗口内最少的采样个数
+    Returns:
+        static: (n,) bool，以time[i]为起点的窗口是否静止
+    """
+    _, acc_var, count = window_stats(time, acc, duration)
+    static = (count >= min_count) & np.all(acc_var < acc_std ** 2, axis=-1)
+    if gyro is not None:
+        _, gyro_var, _ = window_stats(time, gyro, duration)
+        static &= np.all(gyro_var < gyro_std ** 2, axis=-1)
+    return static
+
+
+def static_intervals(time, static, duration):
+    """
+    将连续的静止窗口合并为静止区间
+
+    Returns:
+        intervals: (m, 2)，每个静止区间的起止时间
+    """
+    edge = np.diff(np.concatenate([[0], static.astype(np.int8), [0]]))
+    first = np.flatnonzero(edge == 1)
+    last = np.flatnonzero(edge == -1) - 1
+    return np.stack([time[first], time[last] + duration], axis=-1)
+
+
+def estimate_gravity_bias(imu_time, linear_accel, chassis_time, chassis_accel, duration, starts=None, gravity=9.80665):
+    """
+    在每个候选时刻开始的窗口内，用IMU加速度均值减去底盘的纵向/横向加速度均值得到比力，
+    比力的方向作为重力方向，模长与重力的差作为沿重力方向的加速度计零偏
+    （单个姿态下只有沿重力方向的零偏可观）
+
+    Args:
+        imu_time: (n,) IMU时间
+        linear_accel: (n, 3) IMU三轴加速度
+        chassis_time: (m,) 底盘时间
+        chassis_accel: (m, 2) 底盘的longitudinal_accel和transversal_accel
+        duration: 窗口时长
+        starts: (k,) 候选的初始化时刻，默认为IMU的每个采样时刻
+        gravity: 重力加速度
+    Returns:
+        dict:
+            gravity: (k, 3) IMU坐标系下的重力
+            bias: (k, 3) 沿重力方向的零偏
+            roll, pitch: (k,) 由重力方向得到的横滚角和俯仰角
+            imu_count, chassis_count: (k,) 窗口内的采样个数
+    """
+    starts = imu_time if starts is None else np.asarray(starts)
+    imu_mean, _, imu_count = window_stats(imu_time, linear_accel, duration, starts)
+    chassis_mean, _, chassis_count = window_stats(chassis_time, chassis_accel, duration, starts)
+
+    chassis_acc = np.concatenate([chassis_mean, np.zeros((len(starts), 1))], axis=-1)
+    real_acc = imu_mean - chassis_acc
+    norm = np.linalg.norm(real_acc, axis=-1, keepdims=True)
+    direction = real_acc / norm
+
+    g = gravity * direction
+    return {
+        "gravity": g,
+        "bias": real_acc - g,
+        "roll": np.arctan2(direction[:, 1], direction[:, 2]),
+        "pitch": np.arctan2(-direction[:, 0], np.linalg.norm(direction[:, 1:], axis=-1)),
+        "imu_count": imu_count,
+        "chassis_count": chassis_count,
+    }